@@ -6,7 +6,7 @@
 
 from loguru import logger
 
-from PostCardBot.core import config
+from PostCardBot.core import config, tasks
 from PostCardBot.core.utils import load_handlers
 
 # Setup the storage for states
@@ -26,7 +26,12 @@
 load_handlers(bot, dp)
 
 logger.info("Bot start polling")
-executor.start_polling(dp, skip_updates=True)
+executor.start_polling(
+    dp,
+    skip_updates=True,
+    on_startup=tasks.startup,
+    on_shutdown=tasks.shutdown,
+)
 
 asyncio.run(dp.storage.close())
 asyncio.run(dp.storage.wait_closed())
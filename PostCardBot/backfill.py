@@ -0,0 +1,93 @@
+"""PostCardBot daily stats backfill.
+
+Recomputes the new users and sends of the daily stats rollup from the user
+and history collections, for example:
+
+    python -m PostCardBot.backfill --days 90
+
+Active users, renders and cancels are only counted by the running bot, so
+they are kept as they are.
+"""
+
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from loguru import logger
+
+from PostCardBot.core.model import User
+from PostCardBot.core.rollup import day_key
+from PostCardBot.models import DailyStats, HistoryEntry, PostCard
+
+
+async def count_sends(since):
+    """Count the sends of each postcard by day since a time."""
+
+    results = await HistoryEntry.aggregate(
+        [
+            {"$match": {"created": {"$gte": since}}},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {
+                            "$dateToString": {
+                                "format": "%Y-%m-%d",
+                                "date": "$created",
+                            }
+                        },
+                        "postcard_id": "$postcard_id",
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+    )
+    sends = defaultdict(Counter)
+    for result in results:
+        key = result["_id"]
+        sends[key["day"]][key["postcard_id"]] += result["count"]
+    return sends
+
+
+async def run(days):
+    """Rebuild the recomputable counters of the last days."""
+
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    since = datetime.combine(start, datetime.min.time())
+    new_users = await User.count_by_day(since)
+    sends = await count_sends(since)
+    categories = await PostCard.field_values(
+        "category_id",
+        _id={"$in": list({pk for day in sends.values() for pk in day})},
+    )
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        postcards = sends.get(day_key(day), Counter())
+        category_sends = Counter()
+        for postcard_id, count in postcards.items():
+            category_sends[str(categories.get(postcard_id))] += count
+        await DailyStats(
+            _id=day_key(day),
+            new_users=new_users.get(day, 0),
+            sends=sum(postcards.values()),
+            postcards={str(pk): count for pk, count in postcards.items()},
+            categories=dict(category_sends),
+        ).save()
+    logger.info(f"Backfilled the daily stats of {days} days.")
+
+
+async def main():
+    """Run the backfill."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--days", type=int, default=30, help="number of days to backfill"
+    )
+    args = parser.parse_args()
+    await run(args.days)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Active user sketches for the PostCardBot."""
+
+from datetime import datetime, timedelta
+
+from PostCardBot.core import config, tasks
+from PostCardBot.core.hll import HyperLogLog
+from PostCardBot.core.rollup import day_key
+from PostCardBot.models import ActivitySketch
+
+# Sketches of this process by day, and the days changed since the last
+# flush.
+
+sketches = {}
+
+changed_days = set()
+
+
+def get_key(day):
+    """Get the key of the sketch of this process for a day."""
+
+    return f"{day}:{config.WORKER_NAME}"
+
+
+def record(user_id):
+    """Count a user as active today."""
+
+    day = day_key()
+    sketch = sketches.get(day)
+    if sketch is None:
+        sketch = sketches[day] = HyperLogLog()
+    if sketch.add(user_id):
+        changed_days.add(day)
+
+
+@tasks.flusher("active user sketches")
+async def flush():
+    """Write the sketches changed since the last flush."""
+
+    global changed_days
+
+    days, changed_days = changed_days, set()
+    try:
+        for day in days:
+            await ActivitySketch(
+                _id=get_key(day),
+                day=day,
+                worker=config.WORKER_NAME,
+                registers=bytes(sketches[day].registers),
+            ).save()
+    except Exception:
+        changed_days |= days
+        raise
+
+    # Past days are read from the database from now on.
+    today = day_key()
+    for day in list(sketches):
+        if day != today and day not in changed_days:
+            del sketches[day]
+
+
+async def active_users(days):
+    """
+    Estimate the users active in the last days, today included.
+
+    The sketches of all processes and days are merged, the error is
+    about ``hll.ERROR``.
+    """
+
+    start = day_key(datetime.utcnow() - timedelta(days=days - 1))
+    merged = HyperLogLog()
+    for sketch in await ActivitySketch.filter(day={"$gte": start}):
+        merged.merge(HyperLogLog(sketch.registers))
+    for day, sketch in sketches.items():
+        if day >= start:
+            merged.merge(sketch)
+    return merged.count()
+
+
+@tasks.on_startup
+async def load_activity(dp):
+    """Load the sketch of this process for today."""
+
+    day = day_key()
+    sketch = await ActivitySketch(_id=get_key(day)).get()
+    if sketch:
+        sketches[day] = HyperLogLog(sketch.registers).merge(
+            sketches.get(day, HyperLogLog())
+        )
@@ -0,0 +1,331 @@
+"""Postcard image assets for the PostCardBot."""
+
+import asyncio
+import functools
+
+from aiogram import Bot, types
+
+from loguru import logger
+
+from PostCardBot.core import catalog, config, tasks
+from PostCardBot.core.helpers import download_file, get_font
+from PostCardBot.core.images import (
+    contact_sheet,
+    encode,
+    normalize,
+    perceptual_hash,
+    renditions,
+)
+from PostCardBot.core.storage import TemplateStore
+from PostCardBot.models import Category, PostCard
+
+_ = config.i18n.gettext
+
+CONTACT_SHEET_FONT_SIZE = 28
+
+# Categories whose contact sheet is outdated, and the tasks rebuilding them.
+
+stale_contact_sheets = set()
+
+contact_sheet_tasks = {}
+
+
+async def upload_photo(photo, chat_id=None):
+    """
+    Upload a photo to Telegram and return its largest photo size.
+
+    Photos go to the storage chat. Without one they are uploaded to
+    ``chat_id`` and the message is deleted again.
+    """
+
+    bot = Bot.get_current()
+    target = config.STORAGE_CHAT_ID or chat_id
+
+    async def send():
+        photo.seek(0)
+        return await bot.send_photo(
+            chat_id=target,
+            photo=types.InputFile(photo, filename="postcard.jpg"),
+            disable_notification=True,
+        )
+
+    message = await tasks.retry(send)
+    if not config.STORAGE_CHAT_ID:
+        await bot.delete_message(
+            chat_id=message.chat.id, message_id=message.message_id
+        )
+    return message.photo[-1]
+
+
+def prepare_image(image_bytes):
+    """
+    Decode an uploaded image into its render master, renditions and
+    perceptual hash.
+    """
+
+    master = normalize(image_bytes, config.TEMPLATE_MAX_SIZE)
+    encoded = {
+        name: encode(image, "JPEG", quality=config.RENDITION_QUALITY)
+        for name, image in renditions(master, config.RENDITIONS).items()
+    }
+    return master, encoded, perceptual_hash(master)
+
+
+async def upload_renditions(encoded, chat_id=None):
+    """Upload encoded renditions and describe them for a postcard."""
+
+    photos = await asyncio.gather(
+        *(upload_photo(photo, chat_id) for photo in encoded.values())
+    )
+    return {
+        name: {
+            "file_id": photo.file_id,
+            "width": photo.width,
+            "height": photo.height,
+        }
+        for name, photo in zip(encoded, photos)
+    }
+
+
+async def process_image(file_id, chat_id=None):
+    """
+    Generate the render master and renditions of an uploaded image.
+
+    Returns the fingerprints and renditions as postcard fields.
+    """
+
+    image_bytes = await tasks.retry(lambda: download_file(file_id))
+    loop = asyncio.get_running_loop()
+    master, encoded, phash = await loop.run_in_executor(
+        None, prepare_image, image_bytes
+    )
+    return {
+        "content_hash": await TemplateStore().save(master),
+        "phash": phash,
+        "renditions": await upload_renditions(encoded, chat_id),
+    }
+
+
+async def warn_duplicates(postcard, chat_id):
+    """Tell an admin that a postcard has the same image as others."""
+
+    exact, near = await postcard.find_duplicates()
+    if not (exact or near):
+        return
+
+    lines = [
+        _("⚠️ Postcard {name} may be a duplicate.").format(name=postcard.name)
+    ]
+    if exact:
+        lines.append(
+            _("Same image: {names}").format(
+                names=", ".join(duplicate.name for duplicate in exact)
+            )
+        )
+    if near:
+        lines.append(
+            _("Similar image: {names}").format(
+                names=", ".join(duplicate.name for duplicate in near)
+            )
+        )
+    await Bot.get_current().send_message(chat_id, "\n".join(lines))
+
+
+async def process_postcard_image(postcard_id, file_id, chat_id=None):
+    """
+    Generate the render master and renditions of a postcard image.
+
+    The postcard is only patched when its image is still ``file_id``, so a
+    slow job can not overwrite a newer upload.
+    """
+
+    fields = await process_image(file_id, chat_id)
+    if not await PostCard.update(
+        {"_id": postcard_id, "image": file_id}, **fields
+    ):
+        return
+    logger.info(f"Processed image of postcard {postcard_id}.")
+    await catalog.refresh()
+
+    postcard = await PostCard(_id=postcard_id).get()
+    if postcard is None:
+        # Deleted after the patch.
+        return
+    schedule_contact_sheet(postcard.category_id, chat_id)
+    if chat_id:
+        await warn_duplicates(postcard, chat_id)
+
+
+def schedule_postcard_image(postcard, chat_id=None):
+    """Process a postcard image in the background."""
+
+    return tasks.spawn(
+        process_postcard_image(postcard.pk, postcard.image, chat_id),
+        name=f"postcard-image-{postcard.pk}",
+    )
+
+
+def render_contact_sheet(tiles):
+    """Composite downloaded tile renditions into an encoded sheet."""
+
+    sheet = contact_sheet(
+        [normalize(tile, config.RENDITION_TILE_SIZE) for tile in tiles],
+        config.CONTACT_SHEET_COLUMNS,
+        config.RENDITION_TILE_SIZE,
+        get_font(config.DEFAULT_FONT, CONTACT_SHEET_FONT_SIZE),
+    )
+    return encode(sheet, "JPEG", quality=config.RENDITION_QUALITY)
+
+
+async def build_contact_sheet(category_id, chat_id=None):
+    """Generate the contact sheet of a category and store its file id."""
+
+    postcards, total = await PostCard.paginate(
+        0,
+        config.CONTACT_SHEET_MAX_POSTCARDS,
+        category_id=category_id,
+        is_active=True,
+    )
+    if not postcards:
+        await Category.update(
+            {"_id": category_id},
+            contact_sheet=None,
+            contact_sheet_postcards=[],
+        )
+        await catalog.refresh()
+        return
+
+    tiles = await asyncio.gather(
+        *(
+            tasks.retry(
+                functools.partial(
+                    download_file,
+                    postcard.get_rendition(config.RENDITION_TILE_SIZE),
+                )
+            )
+            for postcard in postcards
+        )
+    )
+    sheet = await asyncio.get_running_loop().run_in_executor(
+        None, render_contact_sheet, tiles
+    )
+    photo = await upload_photo(sheet, chat_id)
+    await Category.update(
+        {"_id": category_id},
+        contact_sheet=photo.file_id,
+        contact_sheet_postcards=[postcard.pk for postcard in postcards],
+    )
+    await catalog.refresh()
+    logger.info(
+        f"Built contact sheet of category {category_id} "
+        f"({len(postcards)} of {total} postcards)."
+    )
+
+
+async def refresh_contact_sheet(category_id, chat_id=None):
+    """Rebuild a contact sheet until no change is left behind."""
+
+    while category_id in stale_contact_sheets:
+        stale_contact_sheets.discard(category_id)
+        await build_contact_sheet(category_id, chat_id)
+
+
+def schedule_contact_sheet(category_id, chat_id=None):
+    """
+    Rebuild the contact sheet of a category in the background.
+
+    Changes made while a sheet is being built are coalesced into one more
+    build after it.
+    """
+
+    if not (config.STORAGE_CHAT_ID or chat_id):
+        return None
+
+    stale_contact_sheets.add(category_id)
+    task = contact_sheet_tasks.get(category_id)
+    if task is None or task.done():
+        task = contact_sheet_tasks[category_id] = tasks.spawn(
+            refresh_contact_sheet(category_id, chat_id),
+            name=f"contact-sheet-{category_id}",
+        )
+    return task
+
+
+async def hash_postcard_image(postcard):
+    """
+    Add the missing perceptual hash of a postcard from its render master.
+
+    Falls back to processing the image when the master is not stored.
+    """
+
+    master = await TemplateStore().load(postcard.content_hash)
+    if master is None:
+        await process_postcard_image(postcard.pk, postcard.image)
+        return
+
+    phash = await asyncio.get_running_loop().run_in_executor(
+        None, perceptual_hash, master
+    )
+    await PostCard.update(
+        {"_id": postcard.pk, "content_hash": postcard.content_hash},
+        phash=phash,
+    )
+    logger.info(f"Hashed image of postcard {postcard.pk}.")
+
+
+async def process_images(postcards):
+    """
+    Process the images of postcards, ``IMAGE_CONCURRENCY`` at a time.
+
+    Postcards that only miss their perceptual hash are hashed from their
+    render master instead of being processed again.
+    """
+
+    postcards = iter(postcards)
+
+    async def work():
+        # Workers share the iterator, so each postcard is processed once.
+        for postcard in postcards:
+            try:
+                if postcard.renditions and postcard.content_hash:
+                    await hash_postcard_image(postcard)
+                else:
+                    await process_postcard_image(postcard.pk, postcard.image)
+            except Exception:
+                logger.exception(
+                    f"Failed to process image of postcard {postcard.pk}."
+                )
+
+    await asyncio.gather(*(work() for _ in range(config.IMAGE_CONCURRENCY)))
+
+
+@tasks.on_startup
+async def process_pending_images(dp):
+    """Resume image processing interrupted by a restart."""
+
+    if not config.STORAGE_CHAT_ID:
+        return
+
+    postcards = await PostCard.filter(
+        image={"$ne": None},
+        **{
+            "$or": [
+                {"renditions": None},
+                {"content_hash": None},
+                {"phash": None},
+            ]
+        },
+    )
+    if postcards:
+        tasks.spawn(process_images(postcards), name="pending-images")
+
+
+@tasks.on_startup
+async def build_missing_contact_sheets(dp):
+    """Build the contact sheets of categories that have none."""
+
+    if not config.STORAGE_CHAT_ID:
+        return
+
+    for category in await Category.filter(contact_sheet=None):
+        schedule_contact_sheet(category.pk)
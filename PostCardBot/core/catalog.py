@@ -0,0 +1,293 @@
+"""In-memory catalog of active categories and postcards."""
+
+import asyncio
+import enum
+import itertools
+from types import MappingProxyType
+
+from aiogram import types
+
+from bson import ObjectId
+from loguru import logger
+
+from PostCardBot.core import config, search, tasks
+from PostCardBot.models import Category, PostCard
+
+_ = config.i18n.gettext
+
+
+class Buttons(enum.Enum):
+    """Catalog buttons."""
+
+    SEND = _("📬 Use this template")
+    POPULAR = _("🔥 Popular")
+    PREVIOUS = "◀️"
+    NEXT = "▶️"
+    BROWSE = _("🎞 One by one")
+    SEARCH = _("🔎 Search")
+
+
+class Texts(enum.Enum):
+    """Catalog texts."""
+
+    CAROUSEL_POSITION = _("Template {position} of {total}")
+
+
+def translate(text, locale):
+    """Translate a text into a locale."""
+
+    return config.i18n.gettext(text, locale=locale)
+
+
+# Carousel key of the most sent postcards of all categories.
+
+POPULAR = "popular"
+
+
+def parse_key(value):
+    """Get the carousel key of a callback data part."""
+
+    return POPULAR if value == POPULAR else ObjectId(value)
+
+
+def get_locales():
+    """Get the locales keyboards are built for."""
+
+    return set(config.i18n.available_locales) | {config.LOCALE}
+
+
+class Catalog:
+    """
+    Immutable snapshot of the active catalog.
+
+    Categories and postcards are ranked by their send counts. Keyboards
+    and carousel pages are built once per locale when the snapshot is
+    built, so browsing only reads from it.
+    """
+
+    def __init__(self, version, categories, postcards, send_counts=None):
+        send_counts = send_counts or {}
+
+        def rank(model):
+            return -(send_counts.get(model.pk) or 0), model.pk
+
+        self.version = version
+        self.categories = tuple(sorted(categories, key=rank))
+        postcards = sorted(postcards, key=rank)
+        self.ranks = MappingProxyType(
+            {postcard.pk: index for index, postcard in enumerate(postcards)}
+        )
+        self.category_index = MappingProxyType(
+            {category.pk: category for category in self.categories}
+        )
+        self.postcards = MappingProxyType(
+            {
+                category.pk: tuple(
+                    postcard
+                    for postcard in postcards
+                    if postcard.category_id == category.pk
+                )
+                for category in self.categories
+            }
+        )
+        self.postcard_index = MappingProxyType(
+            {
+                postcard.pk: postcard
+                for category_postcards in self.postcards.values()
+                for postcard in category_postcards
+            }
+        )
+        self.popular = tuple(
+            postcard
+            for postcard in postcards[: config.POPULAR_SIZE]
+            if send_counts.get(postcard.pk)
+        )
+
+        keyboards = {}
+        pages = {}
+        for locale in get_locales():
+            keyboards[locale, "categories"] = self.build_categories_keyboard(
+                locale
+            )
+            for category in self.categories:
+                keyboards[locale, category.pk] = self.build_sheet_keyboard(
+                    category, locale
+                )
+                pages[locale, category.pk] = self.build_pages(
+                    category.pk, self.postcards[category.pk], locale
+                )
+            pages[locale, POPULAR] = self.build_pages(
+                POPULAR, self.popular, locale
+            )
+        self.keyboards = MappingProxyType(keyboards)
+        self.pages = MappingProxyType(pages)
+
+    def build_categories_keyboard(self, locale):
+        """Build the category selection keyboard."""
+
+        markup = types.InlineKeyboardMarkup()
+        markup.row(
+            types.InlineKeyboardButton(
+                translate(Buttons.SEARCH.value, locale), callback_data="search"
+            )
+        )
+        if self.popular:
+            markup.row(
+                types.InlineKeyboardButton(
+                    translate(Buttons.POPULAR.value, locale),
+                    callback_data=f"category:{POPULAR}",
+                )
+            )
+        for category in self.categories:
+            markup.row(
+                types.InlineKeyboardButton(
+                    category.name,
+                    callback_data=f"category:{category.pk}",
+                )
+            )
+        return markup
+
+    def build_sheet_keyboard(self, category, locale):
+        """Build the number buttons of a category contact sheet."""
+
+        markup = types.InlineKeyboardMarkup(
+            row_width=config.CONTACT_SHEET_COLUMNS
+        )
+        markup.add(
+            *(
+                types.InlineKeyboardButton(
+                    str(number), callback_data=f"send_postcard:{postcard_id}"
+                )
+                for number, postcard_id in enumerate(
+                    category.contact_sheet_postcards or [], start=1
+                )
+            )
+        )
+        markup.row(
+            types.InlineKeyboardButton(
+                translate(Buttons.BROWSE.value, locale),
+                callback_data=f"carousel:{category.pk}:0",
+            )
+        )
+        return markup
+
+    def build_pages(self, key, postcards, locale):
+        """Build the captions and buttons of a carousel."""
+
+        total = len(postcards)
+        pages = []
+        for index, postcard in enumerate(postcards):
+            markup = types.InlineKeyboardMarkup()
+            if total > 1:
+                markup.row(
+                    types.InlineKeyboardButton(
+                        Buttons.PREVIOUS.value,
+                        callback_data=f"carousel:{key}:"
+                        f"{(index - 1) % total}",
+                    ),
+                    types.InlineKeyboardButton(
+                        Buttons.NEXT.value,
+                        callback_data=f"carousel:{key}:"
+                        f"{(index + 1) % total}",
+                    ),
+                )
+            markup.row(
+                types.InlineKeyboardButton(
+                    translate(Buttons.SEND.value, locale),
+                    callback_data=f"send_postcard:{postcard.pk}",
+                )
+            )
+            caption = (
+                postcard.name
+                + "\n\n"
+                + postcard.description
+                + "\n\n"
+                + translate(Texts.CAROUSEL_POSITION.value, locale).format(
+                    position=index + 1, total=total
+                )
+            )
+            pages.append((postcard, caption, markup))
+        return tuple(pages)
+
+    def get_keyboard(self, key, locale=None):
+        """Get a prebuilt keyboard in a locale."""
+
+        locale = locale or config.i18n.ctx_locale.get()
+        return self.keyboards.get(
+            (locale, key), self.keyboards.get((config.LOCALE, key))
+        )
+
+    def get_page(self, key, index, locale=None):
+        """
+        Get the postcard, caption and buttons of a carousel page.
+
+        ``key`` is a category id or ``POPULAR``. Returns ``None`` when the
+        carousel has no postcards. The index wraps around, so stale buttons
+        still open a postcard.
+        """
+
+        locale = locale or config.i18n.ctx_locale.get()
+        pages = self.pages.get(
+            (locale, key), self.pages.get((config.LOCALE, key))
+        )
+        if not pages:
+            return None
+        return pages[index % len(pages)]
+
+
+versions = itertools.count(1)
+
+current = Catalog(0, [], [])
+
+refresh_lock = asyncio.Lock()
+
+
+def get_catalog():
+    """Get the current catalog snapshot."""
+
+    return current
+
+
+async def refresh():
+    """Build a new catalog snapshot and swap it in."""
+
+    global current
+
+    async with refresh_lock:
+        categories = await Category.filter(is_active=True)
+        postcards = await PostCard.filter(
+            is_active=True,
+            category_id={"$in": [category.pk for category in categories]},
+        )
+        send_counts = {
+            **await Category.field_values("send_count", is_active=True),
+            **await PostCard.field_values("send_count", is_active=True),
+        }
+        current = Catalog(next(versions), categories, postcards, send_counts)
+        search.index.update(current.postcard_index.values())
+
+    logger.info(
+        f"Catalog version {current.version} built with "
+        f"{len(current.categories)} categories and "
+        f"{len(current.postcard_index)} postcards."
+    )
+    return current
+
+
+@tasks.on_startup
+async def build_catalog(dp):
+    """Build the catalog when the bot starts."""
+
+    await refresh()
+    tasks.spawn(refresh_periodically(), name="catalog-ranking")
+
+
+async def refresh_periodically():
+    """Rebuild the catalog to pick up new send counts."""
+
+    while True:
+        await asyncio.sleep(config.RANKING_INTERVAL)
+        try:
+            await refresh()
+        except Exception:
+            logger.exception("Failed to refresh the catalog ranking.")
@@ -0,0 +1,109 @@
+"""Stats charts for the PostCardBot."""
+
+import asyncio
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aiogram import types
+
+from PostCardBot.core import config, tasks
+
+# Charts are drawn in a separate process, so matplotlib is never imported
+# by the bot and drawing does not block the event loop. The process is
+# spawned rather than forked, so it does not inherit the bot's event loop,
+# database connections and threads.
+
+chart_executor = ProcessPoolExecutor(
+    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+)
+
+# Telegram file ids of sent charts, with their expiry time, by chart, date
+# range, locale and version of the data they are drawn from.
+
+cache = {}
+
+
+def render_chart(spec):
+    """
+    Draw a chart into PNG bytes, in the chart process.
+
+    ``spec`` has a ``title``, axis labels, the x ``labels`` and a list of
+    ``series`` with a ``kind`` of ``bar`` or ``line``, a ``label``,
+    ``values`` and a ``color``.
+    """
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 5))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    for series in spec["series"]:
+        if series["kind"] == "bar":
+            axes.bar(
+                spec["labels"],
+                series["values"],
+                color=series["color"],
+                label=series["label"],
+            )
+        else:
+            axes.plot(
+                spec["labels"],
+                series["values"],
+                color=series["color"],
+                label=series["label"],
+                linewidth=2,
+                marker="o",
+            )
+    axes.set_title(spec["title"])
+    axes.set_xlabel(spec["xlabel"])
+    axes.set_ylabel(spec["ylabel"])
+    axes.legend()
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    png = io.BytesIO()
+    figure.savefig(png, format="png")
+    return png.getvalue()
+
+
+async def answer_chart(message, key, version, spec, caption=None):
+    """
+    Answer a message with a chart.
+
+    ``key`` names the chart and its date range, ``version`` is the version
+    of the data it is drawn from. A chart sent within ``CHART_CACHE_TTL``
+    seconds in the same locale is sent again by its file id, until the
+    version changes.
+    """
+
+    key = (*key, config.i18n.ctx_locale.get(), version)
+    file_id, expires = cache.get(key, (None, 0))
+    if file_id and expires > time.monotonic():
+        return await message.answer_photo(file_id, caption=caption)
+
+    png = await asyncio.get_running_loop().run_in_executor(
+        chart_executor, render_chart, spec
+    )
+    sent_message = await message.answer_photo(
+        types.InputFile(io.BytesIO(png), filename="chart.png"),
+        caption=caption,
+    )
+
+    outdated = [k for k in cache if k[0] == key[0] and k[-1] != version]
+    for cached_key in outdated:
+        del cache[cached_key]
+    cache[key] = (
+        sent_message.photo[-1].file_id,
+        time.monotonic() + config.CHART_CACHE_TTL,
+    )
+    return sent_message
+
+
+@tasks.on_shutdown
+async def stop_chart_executor(dp):
+    """Stop the chart process."""
+
+    chart_executor.shutdown(wait=False)
@@ -1,7 +1,7 @@
-"""Configuration file for the bot.
-
-"""
+"""Configuration file for the bot."""
 
+import os
+import socket
 from pathlib import Path
 
 from decouple import Csv, config
@@ -61,6 +61,175 @@
     level="ERROR",
 )
 
+# Templates
+
+TEMPLATE_STORAGE = config("TEMPLATE_STORAGE", default="local")
+
+TEMPLATE_STORAGE_PATH = config(
+    "TEMPLATE_STORAGE_PATH",
+    cast=Path,
+    default=str(ROOT_DIR.parent / "templates"),
+)
+
+TEMPLATE_MAX_SIZE = config("TEMPLATE_MAX_SIZE", cast=int, default=2048)
+
+TEMPLATE_CACHE_SIZE = config("TEMPLATE_CACHE_SIZE", cast=int, default=64)
+
+# Renditions generated for every postcard, by their longest side in pixels.
+# Call sites pick the smallest rendition that fits what they show.
+
+RENDITION_TILE_SIZE = config("RENDITION_TILE_SIZE", cast=int, default=160)
+
+RENDITION_BROWSE_SIZE = config("RENDITION_BROWSE_SIZE", cast=int, default=480)
+
+RENDITIONS = {
+    "tile": RENDITION_TILE_SIZE,
+    "browse": RENDITION_BROWSE_SIZE,
+    "master": TEMPLATE_MAX_SIZE,
+}
+
+RENDITION_QUALITY = config("RENDITION_QUALITY", cast=int, default=90)
+
+# Templates whose perceptual hashes differ in at most this many of 64 bits
+# are reported as near duplicates.
+
+DUPLICATE_DISTANCE = config("DUPLICATE_DISTANCE", cast=int, default=6)
+
+# Contact sheets show the first postcards of a category as a numbered grid
+# of tile renditions.
+
+CONTACT_SHEET_COLUMNS = config("CONTACT_SHEET_COLUMNS", cast=int, default=5)
+
+CONTACT_SHEET_MAX_POSTCARDS = config(
+    "CONTACT_SHEET_MAX_POSTCARDS", cast=int, default=30
+)
+
+# Chat where the bot uploads generated images to get their file ids. When it
+# is not set, images are uploaded to the admin's chat and deleted again.
+
+STORAGE_CHAT_ID = config("STORAGE_CHAT_ID", cast=int, default=0)
+
+# Postcard images processed at the same time when resuming after a restart
+
+IMAGE_CONCURRENCY = config("IMAGE_CONCURRENCY", cast=int, default=2)
+
+# Background tasks
+
+TASK_RETRIES = config("TASK_RETRIES", cast=int, default=5)
+
+TASK_RETRY_DELAY = config("TASK_RETRY_DELAY", cast=float, default=1)
+
+# Bulk import
+
+IMPORT_UPLOAD_RATE = config("IMPORT_UPLOAD_RATE", cast=float, default=1)
+
+IMPORT_UPLOAD_CONCURRENCY = config(
+    "IMPORT_UPLOAD_CONCURRENCY", cast=int, default=4
+)
+
+IMPORT_BATCH_SIZE = config("IMPORT_BATCH_SIZE", cast=int, default=50)
+
+# Seconds to wait for the rest of an album after its first photo
+
+ALBUM_COLLECT_DELAY = config("ALBUM_COLLECT_DELAY", cast=float, default=1)
+
+# Fonts
+
+FONTS_PATH = config(
+    "FONTS_PATH", cast=Path, default=str(ROOT_DIR.parent / "fonts")
+)
+
+DEFAULT_FONT = config("DEFAULT_FONT", default="DejaVuSans.ttf")
+
+LAYOUT_CACHE_SIZE = config("LAYOUT_CACHE_SIZE", cast=int, default=4096)
+
+# Fonts used for scripts the text box font does not cover
+
+SCRIPT_FONTS = {
+    "ethiopic": config(
+        "ETHIOPIC_FONT", default="NotoSansEthiopic-Regular.ttf"
+    ),
+}
+
+TEXT_CACHE_SIZE = config("TEXT_CACHE_SIZE", cast=int, default=1024)
+
+# Rendering
+
+RENDER_WORKERS = config("RENDER_WORKERS", cast=int, default=os.cpu_count())
+
+BATCH_MAX_RECIPIENTS = config("BATCH_MAX_RECIPIENTS", cast=int, default=20)
+
+RENDER_CONCURRENCY = config("RENDER_CONCURRENCY", cast=int, default=4)
+
+RENDER_QUEUE_SIZE = config("RENDER_QUEUE_SIZE", cast=int, default=100)
+
+RENDER_USER_LIMIT = config("RENDER_USER_LIMIT", cast=int, default=2)
+
+RENDER_METRICS_WINDOW = config("RENDER_METRICS_WINDOW", cast=int, default=1000)
+
+# Render backend, "local" renders in the bot process, "mongo" hands renders
+# to workers started with `python -m PostCardBot.render_worker`.
+
+RENDER_BACKEND = config("RENDER_BACKEND", default="local")
+
+RENDER_JOB_TIMEOUT = config("RENDER_JOB_TIMEOUT", cast=int, default=120)
+
+# Job queue
+
+JOB_LEASE_SECONDS = config("JOB_LEASE_SECONDS", cast=int, default=60)
+
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", cast=int, default=3)
+
+JOB_RETRY_DELAY = config("JOB_RETRY_DELAY", cast=int, default=5)
+
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", cast=float, default=0.25)
+
+JOB_RETENTION_SECONDS = config(
+    "JOB_RETENTION_SECONDS", cast=int, default=24 * 60 * 60
+)
+
+# Popularity
+
+COUNTER_FLUSH_INTERVAL = config(
+    "COUNTER_FLUSH_INTERVAL", cast=float, default=60
+)
+
+RANKING_INTERVAL = config("RANKING_INTERVAL", cast=float, default=15 * 60)
+
+POPULAR_SIZE = config("POPULAR_SIZE", cast=int, default=20)
+
+# Stats
+
+STATS_DAYS = config("STATS_DAYS", cast=int, default=30)
+
+WORKER_NAME = config("WORKER_NAME", default=socket.gethostname())
+
+STATS_TOP_SIZE = config("STATS_TOP_SIZE", cast=int, default=5)
+
+EVENT_BATCH_SIZE = config("EVENT_BATCH_SIZE", cast=int, default=500)
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+EXPORT_PROGRESS_INTERVAL = config(
+    "EXPORT_PROGRESS_INTERVAL", cast=float, default=5
+)
+
+CHART_CACHE_TTL = config("CHART_CACHE_TTL", cast=int, default=10 * 60)
+
+# History
+
+HISTORY_PAGE_SIZE = config("HISTORY_PAGE_SIZE", cast=int, default=10)
+
+# Search
+
+SEARCH_PAGE_SIZE = config("SEARCH_PAGE_SIZE", cast=int, default=8)
+
+INLINE_PAGE_SIZE = config("INLINE_PAGE_SIZE", cast=int, default=20)
+
+INLINE_CACHE_TIME = config("INLINE_CACHE_TIME", cast=int, default=300)
+
+INLINE_CACHE_SIZE = config("INLINE_CACHE_SIZE", cast=int, default=256)
+
 # Localization
 
 LOCALE = config("LOCALE", default="en")
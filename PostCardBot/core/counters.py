@@ -0,0 +1,68 @@
+"""Batched send counters for the PostCardBot."""
+
+from collections import Counter
+
+from loguru import logger
+from pymongo.errors import BulkWriteError
+
+from PostCardBot.core import tasks
+from PostCardBot.models import Category, PostCard
+
+# Sends counted since the last flush, by postcard and by category.
+
+postcard_sends = Counter()
+
+category_sends = Counter()
+
+
+def record_send(postcard, count=1):
+    """Count sends of a postcard without touching the database."""
+
+    postcard_sends[postcard.pk] += count
+    category_sends[postcard.category_id] += count
+
+
+async def write_sends(model, sends):
+    """
+    Add sends to the send counts of a model.
+
+    Returns the sends that were not written and the error, if any.
+    """
+
+    try:
+        await model.increment("send_count", sends)
+    except BulkWriteError as error:
+        # The write is unordered, so only the failed updates are missing.
+        # Updates that hit a write concern error were applied.
+        keys = list(sends)
+        failed = (keys[item["index"]] for item in error.details["writeErrors"])
+        return Counter({key: sends[key] for key in failed}), error
+    except Exception as error:
+        return sends, error
+    return Counter(), None
+
+
+@tasks.flusher("send counters")
+async def flush():
+    """Write the counted sends with one bulk ``$inc`` per collection."""
+
+    global postcard_sends, category_sends
+
+    postcards, postcard_sends = postcard_sends, Counter()
+    categories, category_sends = category_sends, Counter()
+    unwritten_postcards, postcard_error = await write_sends(
+        PostCard, postcards
+    )
+    unwritten_categories, category_error = await write_sends(
+        Category, categories
+    )
+
+    # Keep the sends that were not written for the next flush.
+    postcard_sends.update(unwritten_postcards)
+    category_sends.update(unwritten_categories)
+
+    written = sum(postcards.values()) - sum(unwritten_postcards.values())
+    if written:
+        logger.info(f"Flushed {written} postcard sends.")
+    if postcard_error or category_error:
+        raise postcard_error or category_error
@@ -24,8 +24,10 @@ def __new__(cls, *args, **kwargs):
 class Database(SingletonClass):
     def __init__(self):
         """
-        Initialize the database.
+        Initialize the database, once for the singleton.
         """
+        if hasattr(self, "db"):
+            return
         logger.info("Initializing database.")
         self.db = self.get_database()
 
@@ -74,6 +74,32 @@ def decorator(callback):
 
         return decorator
 
+    @classmethod
+    def inline_handler(
+        cls,
+        *custom_filters,
+        state=None,
+        run_task=None,
+        **kwargs,
+    ):
+        """
+        Decorator for inline query handlers.
+        """
+
+        def decorator(callback):
+            if isinstance(callback, staticmethod):
+                callback = callback.__func__
+            cls.dp.register_inline_handler(
+                callback,
+                *custom_filters,
+                state=state,
+                run_task=run_task,
+                **kwargs,
+            )
+            return staticmethod(callback)
+
+        return decorator
+
 
 def admin_only(callback):
     """
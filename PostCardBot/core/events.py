@@ -0,0 +1,68 @@
+"""Batched send event log for the PostCardBot."""
+
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+from PostCardBot.core import config, tasks
+from PostCardBot.models import SendEvent
+
+# Events recorded since the last flush.
+
+pending = []
+
+# The flush started because the batch was full, so only one runs at a time.
+
+flush_task = None
+
+# Incremented by every flush that writes events, so caches of views built
+# from the event log can tell they changed.
+
+version = 0
+
+
+def record(action, postcard, user_id, quantity=1, render_time=None):
+    """Record a send event without touching the database."""
+
+    pending.append(
+        SendEvent(
+            meta={
+                "action": action,
+                "postcard_id": postcard.pk,
+                "category_id": postcard.category_id,
+            },
+            user_id=user_id,
+            locale=config.i18n.ctx_locale.get(),
+            render_time=render_time,
+            quantity=quantity,
+            created=datetime.utcnow(),
+        )
+    )
+    global flush_task
+
+    if len(pending) >= config.EVENT_BATCH_SIZE and (
+        flush_task is None or flush_task.done()
+    ):
+        flush_task = tasks.spawn(flush(), name="send-events")
+
+
+@tasks.flusher("send events")
+async def flush():
+    """Write the recorded events with one ``insert_many``."""
+
+    global pending, version
+
+    recorded, pending = pending, []
+    if not recorded:
+        return
+    try:
+        await SendEvent.bulk_create(recorded)
+    except BulkWriteError as error:
+        # The insert is ordered, so the events before the first error were
+        # written. Keep the rest for the next flush.
+        pending[:0] = recorded[error.details["nInserted"] :]  # noqa: E203
+        raise
+    except Exception:
+        pending[:0] = recorded
+        raise
+    version += 1
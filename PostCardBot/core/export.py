@@ -0,0 +1,139 @@
+"""Streaming data exports for the PostCardBot."""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from PostCardBot.core import config
+from PostCardBot.core.model import User
+from PostCardBot.models import DailyStats, SendEvent
+
+EXPORTS = {"users": User, "events": SendEvent, "daily_stats": DailyStats}
+
+FORMATS = ("csv", "jsonl")
+
+# Largest document a bot can upload.
+
+UPLOAD_LIMIT = 50 * 1024 * 1024
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled."""
+
+
+def get_columns(model):
+    """Get the exported fields of a model."""
+
+    columns = [model.meta.pk_field]
+    columns += [
+        field for field in model.meta.fields if field != model.meta.pk_field
+    ]
+    if "created" not in columns:
+        columns.append("created")
+    return columns
+
+
+def to_json(value):
+    """Convert a value JSON cannot encode."""
+
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode(documents, columns, export_format):
+    """Encode documents as CSV rows or JSON lines."""
+
+    if export_format == "jsonl":
+        return "".join(
+            json.dumps(
+                {column: document.get(column) for column in columns},
+                default=to_json,
+                ensure_ascii=False,
+            )
+            + "\n"
+            for document in documents
+        )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for document in documents:
+        row = []
+        for column in columns:
+            value = document.get(column)
+            if value is None:
+                value = ""
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value, default=to_json, ensure_ascii=False)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row.append(value)
+        writer.writerow(row)
+    return buffer.getvalue()
+
+
+def write(file, documents, columns, export_format):
+    """Compress and write documents, in a thread."""
+
+    file.write(encode(documents, columns, export_format).encode())
+
+
+async def export(name, export_format, cancelled, progress=None):
+    """
+    Stream a collection into a gzip compressed file.
+
+    Documents are read through a cursor and compressed in a thread one
+    batch at a time, so memory stays constant and the event loop is free.
+    ``progress`` is awaited with the exported documents every
+    ``EXPORT_PROGRESS_INTERVAL`` seconds. Setting the ``cancelled`` event
+    stops the export with ``ExportCancelled``. Returns the path of the
+    file and the number of documents.
+    """
+
+    model = EXPORTS[name]
+    columns = get_columns(model)
+    loop = asyncio.get_running_loop()
+    handle, path = tempfile.mkstemp(suffix=f".{export_format}.gz")
+    os.close(handle)
+
+    exported = 0
+    reported = time.monotonic()
+    documents = []
+    try:
+        with gzip.open(path, "wb") as file:
+            if export_format == "csv":
+                file.write(",".join(columns).encode() + b"\r\n")
+            async for document in model.stream(config.EXPORT_BATCH_SIZE):
+                documents.append(document)
+                if len(documents) < config.EXPORT_BATCH_SIZE:
+                    continue
+
+                await loop.run_in_executor(
+                    None, write, file, documents, columns, export_format
+                )
+                exported += len(documents)
+                documents = []
+                if cancelled.is_set():
+                    raise ExportCancelled()
+                if (
+                    progress
+                    and time.monotonic() - reported
+                    >= config.EXPORT_PROGRESS_INTERVAL
+                ):
+                    reported = time.monotonic()
+                    await progress(exported)
+
+            await loop.run_in_executor(
+                None, write, file, documents, columns, export_format
+            )
+            exported += len(documents)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, exported
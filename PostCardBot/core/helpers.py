@@ -1,29 +1,322 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 from aiogram import Bot
 
-from PIL import Image, ImageDraw
+from loguru import logger
+from PIL import Image, ImageColor, ImageDraw, ImageFont, features
 
+from PostCardBot.core import config
+from PostCardBot.core.images import normalize
+from PostCardBot.core.jobs import render_queue
+from PostCardBot.core.storage import TemplateStore
 
-async def create_postcard(postcard_image, from_user, to_user):
-    """Create postcard."""
+# Texts are fitted by length class, so names of similar length share one
+# cached fitting result.
 
-    image_byte = BytesIO()
-    image_out = BytesIO()
+LENGTH_CLASS_STEP = 4
 
-    telegram_image = await (
-        (await Bot.get_current().get_file(postcard_image)).download(
-            destination_file=image_byte
-        )
+# Glyph used to estimate the width of an average text of a length class.
+
+SAMPLE_GLYPH = "n"
+
+# Unicode blocks of scripts that are drawn with a fallback font.
+
+SCRIPT_RANGES = (
+    ("ethiopic", 0x1200, 0x139F),
+    ("ethiopic", 0x2D80, 0x2DDF),
+    ("ethiopic", 0xAB00, 0xAB2F),
+)
+
+# Pillow releases the GIL while compositing and encoding, so renders of one
+# batch run in parallel threads.
+
+render_executor = ThreadPoolExecutor(
+    max_workers=config.RENDER_WORKERS, thread_name_prefix="render"
+)
+
+if not features.check("raqm"):
+    logger.warning(
+        "libraqm is not available, complex scripts will not be shaped."
     )
 
-    image = Image.open(telegram_image)
 
-    drawer = ImageDraw.Draw(image)
-    drawer.text((100, 100), from_user, (255, 255, 255))
-    drawer.text((100, 200), to_user, (255, 255, 255))
+async def download_file(file_id):
+    """Download a Telegram file into memory."""
+
+    file_byte = BytesIO()
+    await (await Bot.get_current().get_file(file_id)).download(
+        destination_file=file_byte
+    )
+    return file_byte.getvalue()
+
+
+async def load_template(postcard):
+    """Load the render master of a postcard."""
+
+    if postcard.content_hash:
+        image = await TemplateStore().load(postcard.content_hash)
+        if image is not None:
+            return image
+
+    # Postcards uploaded before the template store existed.
+    image_bytes = await download_file(
+        postcard.get_rendition(config.TEMPLATE_MAX_SIZE)
+    )
+    return await asyncio.get_running_loop().run_in_executor(
+        None, normalize, image_bytes, config.TEMPLATE_MAX_SIZE
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(family, size):
+    """
+    Load a TrueType font once per process.
+
+    Fonts are looked up in ``FONTS_PATH`` first and then in the system font
+    directories.
+    """
+
+    for path in (config.FONTS_PATH / family, family):
+        try:
+            return ImageFont.truetype(str(path), size)
+        except OSError:
+            continue
+    logger.warning(f"Font {family} not found, using the default font.")
+    return ImageFont.load_default()
+
+
+def get_script(char):
+    """
+    Get the script of a character.
+
+    Spaces, digits and punctuation belong to no script and return ``None``.
+    """
+
+    code = ord(char)
+    for script, start, end in SCRIPT_RANGES:
+        if start <= code <= end:
+            return script
+    if not char.isalpha():
+        return None
+    return "default"
+
+
+def split_runs(text, family):
+    """Split text into runs of characters drawn with the same font."""
+
+    runs = []
+    for char in text:
+        script = get_script(char)
+        if script is None and runs:
+            char_family = runs[-1][1]
+        else:
+            char_family = config.SCRIPT_FONTS.get(script, family)
+
+        if runs and runs[-1][1] == char_family:
+            runs[-1][0] += char
+        else:
+            runs.append([char, char_family])
+    return [tuple(run) for run in runs]
+
+
+def place_runs(text, family, size):
+    """
+    Shape a line of text and get its runs and bounding box.
+
+    Runs of other scripts fall back to their configured font and are placed
+    on a shared baseline.
+    """
+
+    placed = []
+    pen = 0
+    for run, run_family in split_runs(text, family):
+        font = get_font(run_family, size)
+        if isinstance(font, ImageFont.FreeTypeFont):
+            bbox = font.getbbox(run, anchor="ls")
+        else:
+            bbox = font.getbbox(run)
+        placed.append((run, font, pen, bbox))
+        pen += font.getlength(run)
+
+    left = min(offset + bbox[0] for _, _, offset, bbox in placed)
+    top = min(bbox[1] for *_, bbox in placed)
+    right = max(offset + bbox[2] for _, _, offset, bbox in placed)
+    bottom = max(bbox[3] for *_, bbox in placed)
+    return placed, (left, top, right, bottom)
+
+
+def measure_text(text, family, size):
+    """Get the size of the mask of a line of text without drawing it."""
+
+    _placed, (left, top, right, bottom) = place_runs(text, family, size)
+    return int(right - left) + 1, int(bottom - top) + 1
+
+
+@functools.lru_cache(maxsize=config.TEXT_CACHE_SIZE)
+def render_text(text, family, size):
+    """
+    Shape and rasterize a line of text into a mask.
+
+    Results are cached, so repeated names and greetings are composited
+    without shaping them again. Only text that is drawn is cached, fitting
+    measures it with ``measure_text``.
+    """
+
+    placed, (left, top, right, bottom) = place_runs(text, family, size)
+    mask = Image.new("L", (int(right - left) + 1, int(bottom - top) + 1))
+    drawer = ImageDraw.Draw(mask)
+    for run, font, offset, _ in placed:
+        position = (offset - left, -top)
+        if isinstance(font, ImageFont.FreeTypeFont):
+            drawer.text(position, run, 255, font=font, anchor="ls")
+        else:
+            drawer.text(position, run, 255, font=font)
+    return mask
+
 
+def get_length_class(text):
+    """Get the length class of a text."""
+
+    return -(-max(len(text), 1) // LENGTH_CLASS_STEP) * LENGTH_CLASS_STEP
+
+
+def text_fits(family, size, text, width, height):
+    """Check whether a single line of text fits into a box."""
+
+    text_width, text_height = measure_text(text, family, size)
+    return text_width <= width and text_height <= height
+
+
+@functools.lru_cache(maxsize=config.LAYOUT_CACHE_SIZE)
+def fit_font_size(template_key, family, size, min_size, box, length_class):
+    """
+    Get the largest font size at which a text of a length class fits.
+
+    ``template_key`` only scopes the cache to one template, the result
+    depends on the remaining arguments.
+    """
+
+    width, height = box
+    sample = SAMPLE_GLYPH * length_class
+    low, high = min_size, max(size, min_size)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if text_fits(family, middle, sample, width, height):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def draw_text(image, text, options, template_key):
+    """Draw text into a layout box of an image."""
+
+    if not text:
+        return
+
+    left, top, right, bottom = options["box"]
+    x0, y0 = int(left * image.width), int(top * image.height)
+    x1, y1 = int(right * image.width), int(bottom * image.height)
+    width, height = x1 - x0, y1 - y0
+
+    family, size = options["font"], options["size"]
+    if options["fit"] == "shrink":
+        size = fit_font_size(
+            template_key,
+            family,
+            size,
+            options["min_size"],
+            (width, height),
+            get_length_class(text),
+        )
+        # The cached size is estimated, make sure the real text fits too.
+        while size > options["min_size"] and not text_fits(
+            family, size, text, width, height
+        ):
+            size -= 1
+
+    mask = render_text(text, family, size)
+    x = {
+        "left": x0,
+        "center": (x0 + x1 - mask.width) // 2,
+        "right": x1 - mask.width,
+    }[options["align"]]
+    y = (y0 + y1 - mask.height) // 2
+    image.paste(ImageColor.getrgb(options["color"]), (x, y), mask)
+
+
+def render_postcard(base, layout, template_key, texts):
+    """Draw texts on a copy of a decoded template and encode it."""
+
+    image = base.copy()
+    for name, text in texts.items():
+        draw_text(image, text, layout[name], template_key)
+
+    image_out = BytesIO()
     image.save(image_out, format="PNG")
     image_out.seek(0)
-
     return image_out
+
+
+def build_base(template, layout, template_key, from_user):
+    """Copy a decoded template and draw the sender name on it."""
+
+    base = template.convert("RGB")
+    draw_text(base, from_user, layout["from_user"], template_key)
+    return base
+
+
+async def create_postcard(postcard, from_user, to_user):
+    """Create postcard."""
+
+    return (await create_postcards(postcard, from_user, [to_user]))[0]
+
+
+async def create_postcards(postcard, from_user, to_users):
+    """
+    Create one postcard per receiver from a single decode of the template.
+
+    The sender name is drawn once on the shared base image, and each
+    receiver is composited and encoded in parallel. All drawing runs in
+    the render executor.
+    """
+
+    loop = asyncio.get_running_loop()
+    layout = postcard.get_layout()
+    template_key = postcard.template_key
+
+    base = await loop.run_in_executor(
+        render_executor,
+        build_base,
+        await load_template(postcard),
+        layout,
+        template_key,
+        from_user,
+    )
+
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                render_executor,
+                render_postcard,
+                base,
+                layout,
+                template_key,
+                {"to_user": to_user},
+            )
+            for to_user in to_users
+        )
+    )
+
+
+async def render_postcards(postcard, from_user, to_users, priority=0):
+    """Create postcards on the configured render backend."""
+
+    if config.RENDER_BACKEND == "mongo":
+        return await render_queue.render(
+            postcard, from_user, to_users, priority
+        )
+    return await create_postcards(postcard, from_user, to_users)
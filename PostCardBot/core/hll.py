@@ -0,0 +1,62 @@
+"""HyperLogLog sketches for the PostCardBot."""
+
+import hashlib
+import math
+
+# 2 ** 12 one-byte registers, about 4 KB per sketch.
+
+PRECISION = 12
+
+REGISTERS = 1 << PRECISION
+
+# Relative standard error of a count.
+
+ERROR = 1.04 / math.sqrt(REGISTERS)
+
+
+class HyperLogLog:
+    """
+    Approximate distinct counter.
+
+    Sketches of different days or processes are merged by taking the
+    highest value of each register, so merging is order independent and
+    merging a sketch twice changes nothing.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers or REGISTERS)
+
+    def add(self, value):
+        """Add a value, returns whether the sketch changed."""
+
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        value_hash = int.from_bytes(digest, "big")
+        index = value_hash >> (64 - PRECISION)
+        rest = value_hash & ((1 << (64 - PRECISION)) - 1)
+        rank = 64 - PRECISION - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Merge another sketch into this one."""
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimate the number of distinct values added."""
+
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        estimate = (
+            alpha
+            * REGISTERS
+            * REGISTERS
+            / sum(2.0**-register for register in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Linear counting is more accurate for small counts.
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
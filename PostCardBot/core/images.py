@@ -0,0 +1,155 @@
+"""Image processing helpers for PostCardBot."""
+
+import hashlib
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Perceptual hashes are built from the low frequencies of a 32x32 DCT.
+
+HASH_IMAGE_SIZE = 32
+
+HASH_SIZE = 8
+
+
+def dct_matrix(size):
+    """
+    Get the orthonormal DCT-II matrix of a size.
+    """
+    frequencies = np.arange(size)[:, None]
+    positions = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * positions + 1) * frequencies / (2 * size))
+    matrix *= np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = dct_matrix(HASH_IMAGE_SIZE)
+
+
+def normalize(image_bytes, max_size):
+    """
+    Decode an uploaded image into an RGB render master.
+
+    The image is capped to ``max_size`` on its longest side so every
+    render starts from the same bounded, already decoded pixels.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding when it can.
+    image.draft("RGB", (max_size, max_size))
+    image = image.convert("RGB")
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image
+
+
+def content_hash(image):
+    """
+    Get the SHA-256 hash of the decoded pixels of an image.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(image):
+    """
+    Get the 64 bit perceptual hash of an image as a hex string.
+
+    Each bit tells whether a low frequency DCT coefficient of the downscaled
+    grayscale image is above their median, so resizing, re-encoding and
+    small edits keep most bits.
+    """
+    pixels = np.asarray(
+        image.convert("L").resize(
+            (HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS
+        ),
+        dtype=np.float64,
+    )
+    coefficients = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = (coefficients > np.median(coefficients)).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hash_distances(hashes, phash):
+    """
+    Get the Hamming distances between perceptual hashes and one hash.
+    """
+    if not hashes:
+        return np.zeros(0, dtype=np.int64)
+    values = np.frombuffer(
+        b"".join(bytes.fromhex(value) for value in hashes), dtype=np.uint8
+    ).reshape(len(hashes), -1)
+    different = values ^ np.frombuffer(bytes.fromhex(phash), dtype=np.uint8)
+    return np.unpackbits(different, axis=1).sum(axis=1)
+
+
+def encode(image, format="PNG", **options):
+    """
+    Encode an image into an in-memory file.
+    """
+    image_out = BytesIO()
+    image.save(image_out, format=format, **options)
+    image_out.seek(0)
+    return image_out
+
+
+def thumbnail(image, size):
+    """
+    Get a downscaled copy of an image.
+    """
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def contact_sheet(tiles, columns, cell_size, font, padding=8):
+    """
+    Composite thumbnails into a numbered grid.
+
+    Tiles are copied into one preallocated pixel array and centered in
+    square cells of ``cell_size`` pixels, numbered from 1 in reading order.
+    """
+    cell = cell_size + 2 * padding
+    rows = -(-len(tiles) // columns)
+    pixels = np.full((rows * cell, columns * cell, 3), 255, dtype=np.uint8)
+    origins = []
+    for index, tile in enumerate(tiles):
+        if max(tile.size) > cell_size:
+            tile = thumbnail(tile, cell_size)
+        tile_pixels = np.asarray(tile.convert("RGB"))
+        height, width = tile_pixels.shape[:2]
+        row, column = divmod(index, columns)
+        top = row * cell + padding + (cell_size - height) // 2
+        left = column * cell + padding + (cell_size - width) // 2
+        bottom, right = top + height, left + width
+        pixels[top:bottom, left:right] = tile_pixels
+        origins.append((column * cell + padding, row * cell + padding))
+
+    sheet = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(sheet)
+    for number, (left, top) in enumerate(origins, start=1):
+        draw.text(
+            (left + padding, top + padding),
+            str(number),
+            font=font,
+            fill="white",
+            stroke_width=3,
+            stroke_fill="black",
+        )
+    return sheet
+
+
+def renditions(master, sizes):
+    """
+    Get downscaled copies of a master for named sizes.
+
+    Each rendition is scaled from the next larger one instead of the
+    master, so small renditions are cheap.
+    """
+    images = {}
+    source = master
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        source = images[name] = thumbnail(source, size)
+    return images
@@ -0,0 +1,310 @@
+"""MongoDB backed job queue for the PostCardBot."""
+
+import asyncio
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from PostCardBot.core import config, tasks
+from PostCardBot.core.db import Database
+
+
+class JobFailed(Exception):
+    """Raised when a job failed on every attempt."""
+
+
+class JobTimeout(Exception):
+    """Raised when a job did not finish in time."""
+
+
+class JobQueue:
+    """
+    Queue of jobs stored in a MongoDB collection.
+
+    Workers lease jobs atomically. A job whose lease runs out before it is
+    completed becomes visible to other workers again, until it runs out of
+    attempts. Every lease has its own token, so only the worker that holds
+    the current lease can finish the job.
+    """
+
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, collection_name):
+        """
+        Initialize the queue.
+        """
+        self.collection = Database().get_collection(collection_name)
+
+    async def create_indexes(self):
+        """
+        Create the indexes used to claim and expire jobs.
+        """
+        await self.collection.create_indexes(
+            [
+                IndexModel(
+                    [
+                        ("status", ASCENDING),
+                        ("priority", ASCENDING),
+                        ("available", ASCENDING),
+                    ]
+                ),
+                IndexModel(
+                    "finished",
+                    expireAfterSeconds=config.JOB_RETENTION_SECONDS,
+                ),
+            ]
+        )
+
+    async def enqueue(self, kind, payload, priority=0):
+        """
+        Add a job to the queue and return its id.
+        """
+        now = datetime.utcnow()
+        result = await self.collection.insert_one(
+            {
+                "kind": kind,
+                "payload": payload,
+                "priority": priority,
+                "status": self.PENDING,
+                "attempts": 0,
+                "available": now,
+                "created": now,
+            }
+        )
+        return result.inserted_id
+
+    async def claim(self, worker_id):
+        """
+        Lease the next available job.
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": self.PENDING, "available": {"$lte": now}},
+                    {"status": self.LEASED, "lease_until": {"$lt": now}},
+                ],
+                "attempts": {"$lt": config.JOB_MAX_ATTEMPTS},
+            },
+            {
+                "$set": {
+                    "status": self.LEASED,
+                    "worker": worker_id,
+                    "lease": ObjectId(),
+                    "lease_until": now
+                    + timedelta(seconds=config.JOB_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", ASCENDING), ("available", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def complete(self, job, result):
+        """
+        Store the result of a leased job.
+
+        Returns ``False`` when the lease was lost and the result is unused.
+        """
+        result = await self.collection.update_one(
+            {"_id": job["_id"], "lease": job["lease"]},
+            {
+                "$set": {
+                    "status": self.DONE,
+                    "result": result,
+                    "finished": datetime.utcnow(),
+                }
+            },
+        )
+        return result.modified_count == 1
+
+    async def fail(self, job, error):
+        """
+        Release a leased job for a retry, or fail it for good.
+        """
+        if job["attempts"] >= config.JOB_MAX_ATTEMPTS:
+            update = {
+                "status": self.FAILED,
+                "error": str(error),
+                "finished": datetime.utcnow(),
+            }
+        else:
+            update = {
+                "status": self.PENDING,
+                "error": str(error),
+                "available": datetime.utcnow()
+                + timedelta(seconds=config.JOB_RETRY_DELAY * job["attempts"]),
+            }
+        await self.collection.update_one(
+            {"_id": job["_id"], "lease": job["lease"]}, {"$set": update}
+        )
+
+    async def expire(self):
+        """
+        Fail leased jobs that timed out on their last attempt.
+        """
+        now = datetime.utcnow()
+        await self.collection.update_many(
+            {
+                "status": self.LEASED,
+                "lease_until": {"$lt": now},
+                "attempts": {"$gte": config.JOB_MAX_ATTEMPTS},
+            },
+            {
+                "$set": {
+                    "status": self.FAILED,
+                    "error": "Lease expired.",
+                    "finished": now,
+                }
+            },
+        )
+
+    async def wait(self, job_id, timeout):
+        """
+        Wait until a job is finished and return its result.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = config.JOB_POLL_INTERVAL
+        while loop.time() < deadline:
+            job = await self.collection.find_one(
+                {
+                    "_id": job_id,
+                    "status": {"$in": [self.DONE, self.FAILED]},
+                },
+            )
+            if job and job["status"] == self.DONE:
+                return job["result"]
+            if job:
+                raise JobFailed(job.get("error"))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.JOB_POLL_INTERVAL * 8)
+        raise JobTimeout(job_id)
+
+    async def abandon(self, job_id):
+        """
+        Fail a job nobody waits for anymore and return it as it was.
+        """
+        return await self.collection.find_one_and_update(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": self.FAILED,
+                    "error": "Abandoned.",
+                    "finished": datetime.utcnow(),
+                },
+                "$unset": {"lease": ""},
+            },
+            return_document=ReturnDocument.BEFORE,
+        )
+
+
+class RenderJobQueue(JobQueue):
+    """
+    Queue of postcard renders.
+
+    Rendered images can be larger than a MongoDB document, so they are
+    handed over through GridFS.
+    """
+
+    bucket_name = "renders"
+
+    def __init__(self):
+        """
+        Initialize the render queue.
+        """
+        super().__init__("render_job")
+        self.bucket = AsyncIOMotorGridFSBucket(
+            Database().db, bucket_name=self.bucket_name
+        )
+
+    async def enqueue_render(self, postcard, from_user, to_users, priority):
+        """
+        Queue a render of a postcard for some receivers.
+        """
+        return await self.enqueue(
+            "render",
+            {
+                "postcard": {
+                    field: getattr(postcard, field)
+                    for field in ("_id", "image", "content_hash", "layout")
+                },
+                "from_user": from_user,
+                "to_users": to_users,
+            },
+            priority,
+        )
+
+    async def store_renders(self, renders):
+        """
+        Upload rendered images and return their GridFS ids.
+        """
+        return [
+            await self.bucket.upload_from_stream("postcard.png", render)
+            for render in renders
+        ]
+
+    async def delete_renders(self, file_ids):
+        """
+        Remove rendered images that will not be loaded from GridFS.
+        """
+        for file_id in file_ids:
+            try:
+                await self.bucket.delete(file_id)
+            except NoFile:
+                pass
+
+    async def load_renders(self, file_ids):
+        """
+        Download rendered images and remove them from GridFS.
+        """
+        renders = []
+        for file_id in file_ids:
+            render = BytesIO()
+            await self.bucket.download_to_stream(file_id, render)
+            render.seek(0)
+            renders.append(render)
+            await self.bucket.delete(file_id)
+        return renders
+
+    async def render(self, postcard, from_user, to_users, priority):
+        """
+        Render postcards on a worker and wait for the images.
+
+        A job that times out is abandoned, so a worker that finishes it
+        later removes its images instead of leaving them in GridFS.
+        """
+        job_id = await self.enqueue_render(
+            postcard, from_user, to_users, priority
+        )
+        logger.info(f"Queued render job {job_id}.")
+        try:
+            file_ids = await self.wait(job_id, config.RENDER_JOB_TIMEOUT)
+        except JobTimeout:
+            job = await self.abandon(job_id)
+            if job and job["status"] == self.DONE:
+                await self.delete_renders(job["result"])
+            raise
+        return await self.load_renders(file_ids)
+
+
+# The render queue of the bot and the render workers, so every render uses
+# the same client and GridFS bucket.
+
+render_queue = RenderJobQueue()
+
+
+@tasks.on_startup
+async def create_render_indexes(dp):
+    """Create the render queue indexes when renders go through it."""
+
+    if config.RENDER_BACKEND == "mongo":
+        await render_queue.create_indexes()
@@ -0,0 +1,64 @@
+"""Prebuilt reply keyboards for the PostCardBot."""
+
+from aiogram.utils.payload import prepare_arg
+
+from PostCardBot.core import config
+
+USER = "user"
+
+ADMIN = "admin"
+
+SUPERUSER = "superuser"
+
+# Keyboard builders by name, and their serialized keyboards by name, locale
+# and role.
+
+builders = {}
+
+cache = {}
+
+
+def register(name):
+    """
+    Register a keyboard builder.
+
+    Builders are called with the role of the user, in the locale the
+    keyboard is built for.
+    """
+
+    def decorator(builder):
+        builders[name] = builder
+        return builder
+
+    return decorator
+
+
+def get_role(user):
+    """Get the keyboard role of a user."""
+
+    if getattr(user, "is_superuser", False):
+        return SUPERUSER
+    if getattr(user, "is_admin", False):
+        return ADMIN
+    return USER
+
+
+def get(name, user=None):
+    """
+    Get a keyboard for the current locale and the role of a user.
+
+    Keyboards are built and serialized once, the JSON string is passed to
+    Telegram as is.
+    """
+
+    key = (name, config.i18n.ctx_locale.get() or config.LOCALE, get_role(user))
+    keyboard = cache.get(key)
+    if keyboard is None:
+        keyboard = cache[key] = prepare_arg(builders[name](key[2]))
+    return keyboard
+
+
+def clear():
+    """Forget the built keyboards, for example after translations reload."""
+
+    cache.clear()
@@ -17,7 +17,9 @@ async def get_user_locale(
 
         current_user = types.User.get_current()
         if current_user is not None:
-            user = await User(id=current_user.id).get_or_create()
+            # Users are created by the UserMiddleware, which counts them as
+            # new when it inserts them.
+            user = await User(id=current_user.id).get()
             locale = user.locale if user else None
             if locale and locale.language in self.locales:
                 *_, data = args
@@ -25,6 +27,14 @@ async def get_user_locale(
                 return language
         return self.default
 
+    def reload(self):
+        """Reload locales and the keyboards built with them."""
+
+        from PostCardBot.core import keyboards
+
+        super().reload()
+        keyboards.clear()
+
 
 class UserMiddleware(LifetimeControllerMiddleware):
     """Middleware for the PostCardBot User."""
@@ -32,7 +42,7 @@ class UserMiddleware(LifetimeControllerMiddleware):
     async def pre_process(self, obj, data, *args):
         """Update user while user interacts with the bot."""
 
-        from PostCardBot.core import config
+        from PostCardBot.core import activity, config, rollup
         from PostCardBot.core.model import User
 
         if isinstance(obj, (types.Message, types.CallbackQuery)):
@@ -41,6 +51,9 @@ async def pre_process(self, obj, data, *args):
                 user = await User(
                     **current_user.to_python(), is_active=True
                 ).save()
+                if user.is_new:
+                    rollup.record("new_users")
+                activity.record(user.pk)
                 obj.from_user.is_admin = user.is_admin
                 obj.from_user.is_superuser = (
                     user.is_superuser or user.pk in config.SUPERUSERS
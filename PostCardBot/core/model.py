@@ -2,14 +2,22 @@
 
 
 import json
-from datetime import datetime
+from datetime import date, datetime
 
 from aiogram.types import User as TelegramUser
 
 import babel
+from loguru import logger
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
 
+from PostCardBot.core import tasks
 from PostCardBot.core.db import Database
 
+# Database models, so their indexes can be created at startup.
+
+registered_models = []
+
 
 class BaseModel:
     def __init_subclass__(cls, **kwargs):
@@ -101,6 +109,13 @@ class DatabaseModel(BaseModel):
 
     db = Database()
 
+    def __init_subclass__(cls, **kwargs):
+        """
+        Register the subclass.
+        """
+        super().__init_subclass__(**kwargs)
+        registered_models.append(cls)
+
     def __new__(cls, *args, **kwargs):
         """
         Create a new model.
@@ -112,6 +127,8 @@ def __new__(cls, *args, **kwargs):
     async def save(self):
         """
         Save the model to the database.
+
+        ``is_new`` of the returned model tells whether it was inserted.
         """
         data = {
             key: value
@@ -125,7 +142,7 @@ async def save(self):
             if key not in self.kwargs and key != "_id"
         }
         if pk:
-            await self.collection.update_one(
+            result = await self.collection.update_one(
                 {self.pk_field: pk},
                 {
                     "$set": data,
@@ -139,6 +156,7 @@ async def save(self):
                 },
                 upsert=True,
             )
+            is_new = result.upserted_id is not None
         else:
             result = await self.collection.insert_one(
                 {
@@ -148,7 +166,11 @@ async def save(self):
                 }
             )
             setattr(self, self.pk_field, result.inserted_id)
-        return await self.get()
+            is_new = True
+        model = await self.get()
+        if model:
+            model.is_new = is_new
+        return model
 
     async def delete(self):
         """
@@ -175,13 +197,15 @@ async def all(cls):
         return [cls.from_dict(d) async for d in data]
 
     @classmethod
-    async def count(cls):
+    async def count(cls, **kwargs):
         """
-        Get the number of models in the database.
+        Get the number of models in the database that match the filter.
         """
         if not hasattr(cls, "collection"):
             cls.collection = cls.db.get_collection(cls.meta.collection_name)
-        return cls.collection.count_documents({})
+        if not kwargs:
+            return await cls.collection.estimated_document_count()
+        return await cls.collection.count_documents(kwargs)
 
     @classmethod
     async def filter(cls, **kwargs):
@@ -195,6 +219,235 @@ async def filter(cls, **kwargs):
 
         return [cls.from_dict(d) async for d in data]
 
+    @classmethod
+    async def stream(cls, batch_size=1000, projection=None, **kwargs):
+        """
+        Iterate over the documents that match the filter.
+
+        Documents are fetched in batches, so only one batch is in memory.
+        ``projection`` limits the fields that are fetched.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        async for document in cls.collection.find(
+            kwargs, projection, batch_size=batch_size
+        ):
+            yield document
+
+    @classmethod
+    async def paginate(cls, offset, limit, **kwargs):
+        """
+        Get a page of the models that match the filter and their total.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        total = await cls.collection.count_documents(kwargs)
+        data = (
+            cls.collection.find(kwargs)
+            .sort(cls.meta.pk_field)
+            .skip(offset)
+            .limit(limit)
+        )
+        return [cls.from_dict(d) async for d in data], total
+
+    @classmethod
+    async def seek(cls, limit, before=None, **kwargs):
+        """
+        Get the newest models that match the filter, by keyset.
+
+        ``before`` is the ``(created, pk)`` of the last model of the
+        previous page. Pages do not skip documents, so deep pages are as
+        fast as the first one.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        if before:
+            created, pk = before
+            kwargs["$or"] = [
+                {"created": {"$lt": created}},
+                {"created": created, cls.meta.pk_field: {"$lt": pk}},
+            ]
+        data = (
+            cls.collection.find(kwargs)
+            .sort([("created", -1), (cls.meta.pk_field, -1)])
+            .limit(limit)
+        )
+        return [cls.from_dict(d) async for d in data]
+
+    @classmethod
+    async def bulk_create(cls, models):
+        """
+        Insert new models into the database with one write.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        now = datetime.utcnow()
+        documents = [
+            {
+                key: value
+                for key, value in model.to_dict().items()
+                if key != model.pk_field or value is not None
+            }
+            for model in models
+        ]
+        for document in documents:
+            if document.get("created") is None:
+                document["created"] = now
+        result = await cls.collection.insert_many(documents)
+        for model, inserted_id in zip(models, result.inserted_ids):
+            setattr(model, model.pk_field, inserted_id)
+        return models
+
+    @classmethod
+    async def update(cls, query, **kwargs):
+        """
+        Update the models in the database that match the query.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        result = await cls.collection.update_many(
+            query,
+            {"$set": kwargs, "$currentDate": {"lastModified": True}},
+        )
+        return result.modified_count
+
+    @classmethod
+    async def increment(cls, field, counts):
+        """
+        Add to a counter field of many models with one bulk write.
+
+        ``counts`` maps primary keys to the amounts to add.
+        """
+        if not counts:
+            return
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        await cls.collection.bulk_write(
+            [
+                UpdateOne({cls.meta.pk_field: pk}, {"$inc": {field: count}})
+                for pk, count in counts.items()
+            ],
+            ordered=False,
+        )
+
+    @classmethod
+    async def bulk_increment(cls, counts):
+        """
+        Add to counter fields of many models with one bulk write.
+
+        ``counts`` maps primary keys to the amounts to add by field. Missing
+        models are created.
+        """
+        if not counts:
+            return
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        await cls.collection.bulk_write(
+            [
+                UpdateOne(
+                    {cls.meta.pk_field: pk},
+                    {
+                        "$inc": dict(fields),
+                        "$setOnInsert": {"created": datetime.utcnow()},
+                    },
+                    upsert=True,
+                )
+                for pk, fields in counts.items()
+            ],
+            ordered=False,
+        )
+
+    @classmethod
+    async def aggregate(cls, pipeline):
+        """
+        Run an aggregation pipeline on the models collection.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        return [d async for d in cls.collection.aggregate(pipeline)]
+
+    @classmethod
+    async def field_values(cls, field, **kwargs):
+        """
+        Get one field of the models that match the filter, by primary key.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        data = cls.collection.find(kwargs, {field: True})
+        return {d[cls.meta.pk_field]: d.get(field) async for d in data}
+
+    @classmethod
+    async def count_by_day(cls, since, **kwargs):
+        """
+        Count the models created on each day since a time.
+
+        Days are counted in the database from the ``created`` index, only
+        the counts of the days with models are returned, by date.
+        """
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        data = cls.collection.aggregate(
+            [
+                {"$match": {**kwargs, "created": {"$gte": since}}},
+                {"$project": {"_id": 0, "created": 1}},
+                {
+                    "$group": {
+                        "_id": {
+                            "$dateToString": {
+                                "format": "%Y-%m-%d",
+                                "date": "$created",
+                            }
+                        },
+                        "count": {"$sum": 1},
+                    }
+                },
+            ]
+        )
+        return {date.fromisoformat(d["_id"]): d["count"] async for d in data}
+
+    @classmethod
+    async def create_collection(cls):
+        """
+        Create a time-series collection declared in the model meta.
+
+        Servers without time-series collections get a regular one.
+        """
+        if not cls.meta.timeseries:
+            return
+        name = cls.meta.collection_name
+        database = cls.db.db
+        if await database.list_collection_names(filter={"name": name}):
+            return
+
+        try:
+            await database.create_collection(
+                name, timeseries=cls.meta.timeseries
+            )
+        except OperationFailure as error:
+            logger.warning(f"Creating {name} as a regular collection: {error}")
+
+    @classmethod
+    async def create_indexes(cls):
+        """
+        Create the indexes declared in the model meta.
+        """
+        if not cls.meta.indexes:
+            return
+        if not hasattr(cls, "collection"):
+            cls.collection = cls.db.get_collection(cls.meta.collection_name)
+
+        await cls.collection.create_indexes(cls.meta.indexes)
+
     async def get_or_create(self, **kwargs):
         """
         Get the model from the database or create a new one.
@@ -224,6 +477,8 @@ class Meta(BaseModel.Meta):
         pk_field = "_id"
         collection_name = None
         fields = []
+        indexes = []
+        timeseries = None
 
 
 class User(DatabaseModel, TelegramUser):
@@ -256,6 +511,7 @@ class Meta(DatabaseModel.Meta):
             "supports_inline_queries",
             "created",
         ]
+        indexes = [IndexModel("created")]
 
     @property
     def locale(self):
@@ -272,3 +528,12 @@ def locale(self):
                 ),
             )
         return getattr(self, "_locale")
+
+
+@tasks.on_startup
+async def create_indexes(dp):
+    """Create the collections and indexes of all database models."""
+
+    for model in registered_models:
+        await model.create_collection()
+        await model.create_indexes()
@@ -0,0 +1,55 @@
+"""Daily stats rollup for the PostCardBot."""
+
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from PostCardBot.core import tasks
+from PostCardBot.models import DailyStats
+
+# Counters recorded since the last flush, by day and field.
+
+pending = defaultdict(Counter)
+
+# Incremented by every flush that writes counters, so caches of views built
+# from the daily stats can tell they changed.
+
+version = 0
+
+
+def day_key(moment=None):
+    """Get the daily stats key of a time, now by default."""
+
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def record(field, count=1):
+    """Add to a counter of today without touching the database."""
+
+    pending[day_key()][field] += count
+
+
+def record_send(postcard, count=1):
+    """Count sends of a postcard today."""
+
+    counts = pending[day_key()]
+    counts["sends"] += count
+    counts[f"postcards.{postcard.pk}"] += count
+    counts[f"categories.{postcard.category_id}"] += count
+
+
+@tasks.flusher("daily stats")
+async def flush():
+    """Write the recorded counters with one bulk ``$inc``."""
+
+    global pending, version
+
+    days, pending = pending, defaultdict(Counter)
+    if not days:
+        return
+    try:
+        await DailyStats.bulk_increment(days)
+    except Exception:
+        for day, counts in days.items():
+            pending[day].update(counts)
+        raise
+    version += 1
@@ -0,0 +1,186 @@
+"""Render scheduler for the PostCardBot."""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, deque
+
+from loguru import logger
+
+from PostCardBot.core import config, tasks
+from PostCardBot.core.db import SingletonClass
+
+
+class SchedulerError(Exception):
+    """Base error of the render scheduler."""
+
+
+class QueueFull(SchedulerError):
+    """Raised when the render queue has no free slot."""
+
+
+class UserLimitReached(SchedulerError):
+    """Raised when a user already has too many renders in flight."""
+
+
+class RenderJob:
+    """A render waiting in the scheduler queue."""
+
+    def __init__(self, priority, sequence, user_id, factory):
+        """
+        Initialize the job.
+        """
+        self.priority = priority
+        self.sequence = sequence
+        self.user_id = user_id
+        self.factory = factory
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+        self.position = 0
+
+    def __lt__(self, other):
+        """
+        Order jobs by priority, then by arrival.
+        """
+        return (self.priority, self.sequence) < (
+            other.priority,
+            other.sequence,
+        )
+
+    def __await__(self):
+        """
+        Wait for the result of the job.
+        """
+        return self.future.__await__()
+
+
+class RenderScheduler(SingletonClass):
+    """
+    Bounded priority queue of renders.
+
+    A fixed number of workers take jobs from the queue, so bursts of users
+    wait in line instead of rendering and downloading all at once.
+    """
+
+    PREVIEW = 0
+    BATCH = 1
+
+    def __init__(self):
+        """
+        Initialize the scheduler once.
+        """
+        if hasattr(self, "queue"):
+            return
+        # Heap of waiting jobs, and a count of them for the workers.
+        self.queue = []
+        self.queued = asyncio.Semaphore(0)
+        self.workers = []
+        self.sequence = itertools.count()
+        self.in_flight = Counter()
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=config.RENDER_METRICS_WINDOW)
+
+    def start(self):
+        """
+        Start the workers.
+        """
+        while len(self.workers) < config.RENDER_CONCURRENCY:
+            self.workers.append(
+                asyncio.create_task(self.work(), name="render-worker")
+            )
+
+    def submit(self, user_id, priority, factory):
+        """
+        Queue a render.
+
+        ``factory`` is called without arguments by a worker and must return
+        an awaitable. The returned job can be awaited for the result, and
+        its ``position`` is its place in line, or 0 when a worker is free.
+        """
+        self.start()
+
+        if self.in_flight[user_id] >= config.RENDER_USER_LIMIT:
+            self.rejected += 1
+            raise UserLimitReached(user_id)
+
+        if len(self.queue) >= config.RENDER_QUEUE_SIZE:
+            self.rejected += 1
+            logger.warning("Render queue is full, rejecting render.")
+            raise QueueFull()
+
+        job = RenderJob(priority, next(self.sequence), user_id, factory)
+        ahead = sum(queued < job for queued in self.queue)
+        heapq.heappush(self.queue, job)
+        self.queued.release()
+
+        self.in_flight[user_id] += 1
+        job.position = max(
+            0, ahead + self.running - config.RENDER_CONCURRENCY + 1
+        )
+        return job
+
+    async def work(self):
+        """
+        Run queued jobs forever.
+        """
+        while True:
+            await self.queued.acquire()
+            job = heapq.heappop(self.queue)
+            self.waits.append(time.monotonic() - job.enqueued)
+            self.running += 1
+            try:
+                # Jobs whose caller went away are skipped.
+                if not job.future.done():
+                    result = await job.factory()
+                    if not job.future.done():
+                        job.future.set_result(result)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as error:
+                logger.exception("Render failed.")
+                if not job.future.done():
+                    job.future.set_exception(error)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                self.in_flight[job.user_id] -= 1
+                if not self.in_flight[job.user_id]:
+                    del self.in_flight[job.user_id]
+
+    async def stop(self):
+        """
+        Cancel the workers and the jobs still waiting in the queue.
+        """
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+        for job in self.queue:
+            job.future.cancel()
+
+    def metrics(self):
+        """
+        Get queue depth and wait time metrics.
+        """
+        waits = sorted(self.waits)
+        return {
+            "depth": len(self.queue),
+            "capacity": config.RENDER_QUEUE_SIZE,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_avg": sum(waits) / len(waits) if waits else 0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0,
+            "wait_max": waits[-1] if waits else 0,
+        }
+
+
+@tasks.on_shutdown
+async def stop_scheduler(dp):
+    """Stop the render workers."""
+
+    await RenderScheduler().stop()
@@ -0,0 +1,174 @@
+"""In-memory postcard search for the PostCardBot."""
+
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+
+from PostCardBot.models import PostCard
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Ethiopic syllables come in rows of eight vowel orders per consonant. Rows
+# of consonants that are pronounced the same are folded into one, so a
+# query matches whichever spelling a template uses.
+
+ETHIOPIC_START = 0x1200
+
+ETHIOPIC_END = 0x1380
+
+ETHIOPIC_HOMOPHONES = {
+    0x1210: 0x1200,  # ሐ -> ሀ
+    0x1280: 0x1200,  # ኀ -> ሀ
+    0x1220: 0x1230,  # ሠ -> ሰ
+    0x12D0: 0x12A0,  # ዐ -> አ
+    0x1340: 0x1338,  # ፀ -> ጸ
+}
+
+# The fourth order of ሀ and አ is written for the first one.
+
+ETHIOPIC_VOWELS = {"ሃ": "ሀ", "ኣ": "አ"}
+
+
+def fold_ethiopic(char):
+    """Fold an Ethiopic syllable into its homophone."""
+
+    code = ord(char)
+    if ETHIOPIC_START <= code < ETHIOPIC_END:
+        row = code - (code - ETHIOPIC_START) % 8
+        if row in ETHIOPIC_HOMOPHONES:
+            char = chr(ETHIOPIC_HOMOPHONES[row] + code - row)
+    return ETHIOPIC_VOWELS.get(char, char)
+
+
+def normalize(text):
+    """
+    Normalize text for search.
+
+    Case and Latin diacritics are dropped and Ethiopic homophones are
+    folded.
+    """
+
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(
+        fold_ethiopic(char) for char in text if not unicodedata.combining(char)
+    )
+
+
+def tokenize(text):
+    """Split text into normalized words."""
+
+    return WORD_PATTERN.findall(normalize(text))
+
+
+class SearchIndex:
+    """
+    Inverted index of postcard names and descriptions.
+
+    Words map to the ids of the postcards that contain them. The sorted
+    word list answers prefix queries, so results show while a word is
+    still being typed.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.documents = {}
+        self.words = []
+        self.ready = False
+
+    def add(self, postcard_id, text):
+        """Index the text of a postcard."""
+
+        words = set(tokenize(text))
+        self.documents[postcard_id] = (text, words)
+        for word in words:
+            self.postings[word].add(postcard_id)
+
+    def remove(self, postcard_id):
+        """Remove a postcard from the index."""
+
+        _text, words = self.documents.pop(postcard_id)
+        for word in words:
+            self.postings[word].discard(postcard_id)
+            if not self.postings[word]:
+                del self.postings[word]
+
+    def update(self, postcards):
+        """
+        Make the index match a set of postcards.
+
+        Only postcards that were added, removed or whose text changed are
+        re-indexed.
+        """
+
+        texts = {
+            postcard.pk: f"{postcard.name}\n{postcard.description}"
+            for postcard in postcards
+        }
+        changed = False
+        for postcard_id in list(self.documents):
+            if self.documents[postcard_id][0] != texts.get(postcard_id):
+                self.remove(postcard_id)
+                changed = True
+        for postcard_id, text in texts.items():
+            if postcard_id not in self.documents:
+                self.add(postcard_id, text)
+                changed = True
+
+        if changed:
+            self.words = sorted(self.postings)
+        self.ready = True
+
+    def lookup(self, prefix):
+        """Get the ids of the postcards with a word starting with prefix."""
+
+        ids = set()
+        start = bisect.bisect_left(self.words, prefix)
+        for word in self.words[start:]:
+            if not word.startswith(prefix):
+                break
+            ids |= self.postings[word]
+        return ids
+
+    def search(self, query):
+        """
+        Get the ids of the postcards that match every word of a query.
+
+        The last word also matches as a prefix.
+        """
+
+        words = tokenize(query)
+        if not words:
+            return set()
+
+        *complete, last = words
+        results = self.lookup(last)
+        for word in complete:
+            results &= self.postings.get(word, set())
+        return results
+
+
+index = SearchIndex()
+
+
+async def find(query, catalog):
+    """
+    Find the active postcards of a catalog snapshot that match a query.
+
+    Results are in catalog rank order. Before the index is built the
+    database text index is used.
+    """
+
+    if not index.ready:
+        return await PostCard.filter(
+            is_active=True, **{"$text": {"$search": query}}
+        )
+
+    return sorted(
+        (
+            catalog.postcard_index[postcard_id]
+            for postcard_id in index.search(query)
+            if postcard_id in catalog.postcard_index
+        ),
+        key=lambda postcard: catalog.ranks[postcard.pk],
+    )
@@ -0,0 +1,114 @@
+"""Statistics of the admin panel."""
+
+from datetime import datetime, timedelta
+
+from PostCardBot.core import config
+from PostCardBot.core.model import User
+from PostCardBot.core.rollup import day_key
+from PostCardBot.models import DailyStats, SendEvent
+
+
+async def get_daily_stats(start):
+    """Get the daily stats since a date, by date."""
+
+    return {
+        stats.pk: stats
+        for stats in await DailyStats.filter(_id={"$gte": day_key(start)})
+    }
+
+
+async def user_growth(days=None):
+    """
+    Get the new and total users of each of the last days.
+
+    New users are read from the daily stats rollup, days without new users
+    are filled with zeros. Returns the dates, new users and total users.
+    """
+
+    days = days or config.STATS_DAYS
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    daily_stats = await get_daily_stats(start)
+
+    dates, new_users = [], []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        stats = daily_stats.get(day_key(day))
+        dates.append(day)
+        new_users.append(stats.new_users if stats else 0)
+
+    total_users = []
+    total = await User.count() - sum(new_users)
+    for count in new_users:
+        total += count
+        total_users.append(total)
+    return dates, new_users, total_users
+
+
+def top(field):
+    """Get the pipeline of the most sent postcards by a meta field."""
+
+    return [
+        {"$match": {"meta.action": SendEvent.CONFIRM}},
+        {"$group": {"_id": f"$meta.{field}", "count": {"$sum": "$quantity"}}},
+        {"$sort": {"count": -1}},
+        {"$limit": config.STATS_TOP_SIZE},
+    ]
+
+
+async def send_stats(days=None):
+    """
+    Aggregate the send events of the last days in one pass.
+
+    Returns the dates and confirmed sends of each day, the postcards of each
+    action, and the most sent postcard and category ids with their sends.
+    """
+
+    days = days or config.STATS_DAYS
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    since = datetime.combine(start, datetime.min.time())
+    [result] = await SendEvent.aggregate(
+        [
+            {"$match": {"created": {"$gte": since}}},
+            {
+                "$facet": {
+                    "days": [
+                        {"$match": {"meta.action": SendEvent.CONFIRM}},
+                        {
+                            "$group": {
+                                "_id": {
+                                    "$dateToString": {
+                                        "format": "%Y-%m-%d",
+                                        "date": "$created",
+                                    }
+                                },
+                                "count": {"$sum": "$quantity"},
+                            }
+                        },
+                    ],
+                    "actions": [
+                        {
+                            "$group": {
+                                "_id": "$meta.action",
+                                "count": {"$sum": "$quantity"},
+                            }
+                        }
+                    ],
+                    "postcards": top("postcard_id"),
+                    "categories": top("category_id"),
+                }
+            },
+        ]
+    )
+
+    def counts(facet):
+        return {d["_id"]: d["count"] for d in result[facet]}
+
+    sends_by_day = counts("days")
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    return {
+        "dates": dates,
+        "sends": [sends_by_day.get(day_key(day), 0) for day in dates],
+        "actions": counts("actions"),
+        "postcards": list(counts("postcards").items()),
+        "categories": list(counts("categories").items()),
+    }
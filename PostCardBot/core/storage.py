@@ -0,0 +1,158 @@
+"""Render master storage for postcard templates."""
+
+import asyncio
+import functools
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+from gridfs.errors import FileExists, NoFile
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from PIL import Image
+
+from PostCardBot.core import config
+from PostCardBot.core.db import SingletonClass
+from PostCardBot.core.images import content_hash
+from PostCardBot.core.model import DatabaseModel
+
+# Every master file starts with a small header followed by raw pixels in
+# RGBX layout, which is how Pillow keeps RGB images in memory. This lets the
+# file be mapped as image memory directly instead of being decoded.
+
+MASTER_MAGIC = b"PCBM"
+
+MASTER_HEADER = struct.Struct("<4sII4x")
+
+
+@functools.lru_cache(maxsize=config.TEMPLATE_CACHE_SIZE)
+def _map_master(path):
+    """
+    Memory-map a master file.
+
+    Mappings are kept open so repeated renders of the same template share
+    the page cache instead of reading the file again.
+    """
+    with open(path, "rb") as master_file:
+        return mmap.mmap(master_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class TemplateStore(SingletonClass):
+    """
+    Storage of normalized render masters, keyed by content hash.
+
+    Masters are always read from the local directory. With the ``gridfs``
+    backend they are also uploaded to GridFS, and the local directory acts
+    as a cache that is filled on first use.
+    """
+
+    bucket_name = "templates"
+
+    def __init__(self):
+        """
+        Initialize the template store, once for the singleton.
+        """
+        if hasattr(self, "root"):
+            return
+        self.root = Path(config.TEMPLATE_STORAGE_PATH)
+        self.bucket = None
+        if config.TEMPLATE_STORAGE == "gridfs":
+            self.bucket = AsyncIOMotorGridFSBucket(
+                DatabaseModel.db.db, bucket_name=self.bucket_name
+            )
+
+    def path(self, key):
+        """
+        Get the local path of a master.
+        """
+        return self.root / key[:2] / f"{key}.raw"
+
+    def write(self, image):
+        """
+        Write an RGB image as a master file and return its content hash.
+        """
+        key = content_hash(image)
+        path = self.path(key)
+        if path.exists():
+            return key
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(descriptor, "wb") as master_file:
+            master_file.write(
+                MASTER_HEADER.pack(MASTER_MAGIC, image.width, image.height)
+            )
+            master_file.write(image.tobytes("raw", "RGBX"))
+        os.replace(temp_path, path)
+        return key
+
+    def open(self, key):
+        """
+        Open a local master without copying its pixels.
+
+        The returned image is read-only and backed by the mapped file.
+        Renderers must convert or copy it before drawing.
+        """
+        path = self.path(key)
+        if not path.exists():
+            return None
+
+        buffer = _map_master(str(path))
+        magic, width, height = MASTER_HEADER.unpack_from(buffer)
+        if magic != MASTER_MAGIC:
+            logger.error(f"Invalid template master: {path}.")
+            return None
+
+        return Image.frombuffer(
+            "RGBX",
+            (width, height),
+            memoryview(buffer)[MASTER_HEADER.size :],  # noqa: E203
+            "raw",
+            "RGBX",
+            0,
+            1,
+        )
+
+    async def save(self, image):
+        """
+        Store a normalized image and return its content hash.
+        """
+        loop = asyncio.get_running_loop()
+        key = await loop.run_in_executor(None, self.write, image)
+        await self.upload(key)
+        logger.info(f"Stored template master {key}.")
+        return key
+
+    async def upload(self, key):
+        """
+        Upload a local master to GridFS when it is the configured backend.
+        """
+        if self.bucket is None:
+            return
+
+        with open(self.path(key), "rb") as master_file:
+            try:
+                await self.bucket.upload_from_stream_with_id(
+                    key, f"{key}.raw", master_file
+                )
+            except FileExists:
+                pass
+
+    async def load(self, key):
+        """
+        Load a master by its content hash.
+        """
+        path = self.path(key)
+        if not path.exists() and self.bucket is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=path.parent)
+            try:
+                with os.fdopen(descriptor, "wb") as master_file:
+                    await self.bucket.download_to_stream(key, master_file)
+            except NoFile:
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, path)
+        return self.open(key)
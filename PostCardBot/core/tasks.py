@@ -0,0 +1,132 @@
+"""Background tasks for the PostCardBot."""
+
+import asyncio
+
+from aiogram.utils.exceptions import RetryAfter
+
+from loguru import logger
+
+from PostCardBot.core import config
+
+# References to running tasks, so they are not garbage collected.
+
+running_tasks = set()
+
+startup_callbacks = []
+
+shutdown_callbacks = []
+
+# Coroutine functions writing data buffered in memory, with their names.
+
+flushers = []
+
+
+def _task_done(task):
+    """Forget a finished task and log its error."""
+
+    running_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.opt(exception=task.exception()).error(
+            f"Background task {task.get_name()} failed."
+        )
+
+
+def spawn(coroutine, name=None):
+    """Run a coroutine in the background."""
+
+    task = asyncio.create_task(coroutine, name=name)
+    running_tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
+
+async def retry(factory, attempts=None, delay=None):
+    """
+    Await ``factory()`` until it succeeds.
+
+    Telegram flood limits are respected, other errors are retried with an
+    exponential backoff and raised after the last attempt.
+    """
+
+    attempts = attempts or config.TASK_RETRIES
+    delay = delay or config.TASK_RETRY_DELAY
+    for attempt in range(1, attempts + 1):
+        try:
+            return await factory()
+        except RetryAfter as error:
+            if attempt == attempts:
+                raise
+            await asyncio.sleep(error.timeout)
+        except Exception as error:
+            if attempt == attempts:
+                raise
+            logger.warning(f"Attempt {attempt} failed, retrying: {error}")
+            await asyncio.sleep(delay * 2 ** (attempt - 1))
+
+
+def on_startup(callback):
+    """Register a coroutine function to run when the bot starts."""
+
+    startup_callbacks.append(callback)
+    return callback
+
+
+def on_shutdown(callback):
+    """Register a coroutine function to run when the bot stops."""
+
+    shutdown_callbacks.append(callback)
+    return callback
+
+
+def flusher(name):
+    """
+    Register a coroutine function that writes data buffered in memory.
+
+    Flushers run every ``COUNTER_FLUSH_INTERVAL`` seconds while the bot
+    runs and once more when it stops. A flush that raises must keep the
+    data it did not write for the next one.
+    """
+
+    def decorator(flush):
+        flushers.append((name, flush))
+        return flush
+
+    return decorator
+
+
+async def flush_periodically(name, flush):
+    """Run a flusher every ``COUNTER_FLUSH_INTERVAL`` seconds."""
+
+    while True:
+        await asyncio.sleep(config.COUNTER_FLUSH_INTERVAL)
+        try:
+            await flush()
+        except Exception:
+            logger.exception(f"Failed to flush {name}.")
+
+
+async def startup(dp):
+    """Run the startup callbacks and start the flushers."""
+
+    for callback in startup_callbacks:
+        await callback(dp)
+
+    for name, flush in flushers:
+        spawn(flush_periodically(name, flush), name=f"flush-{name}")
+
+
+async def shutdown(dp):
+    """Run the shutdown callbacks, flush and stop background tasks."""
+
+    for callback in shutdown_callbacks:
+        await callback(dp)
+
+    for name, flush in flushers:
+        try:
+            await flush()
+        except Exception:
+            logger.exception(f"Failed to flush {name}.")
+
+    for task in list(running_tasks):
+        task.cancel()
+    await asyncio.gather(*running_tasks, return_exceptions=True)
@@ -1,8 +1,10 @@
 from .admin_panel.administrator import AdministratorHandler
+from .admin_panel.export import ExportHandler
 from .admin_panel.postcard.category import CategoryHandler
 from .admin_panel.postcard.postcards import AdminPanelPostCardsHandler
 from .admin_panel.stats import StatsHandler
 from .admin_panel.users import AdminPanelUsersHandler
+from .inline import InlinePostCardHandler
 from .main_menu import MainMenuHandler
 from .settings import SettingsHandler
 from .user_postcard import UserPostCardHandler
@@ -15,5 +17,7 @@
     CategoryHandler,
     AdminPanelUsersHandler,
     AdminPanelPostCardsHandler,
+    ExportHandler,
     UserPostCardHandler,
+    InlinePostCardHandler,
 ]
@@ -7,7 +7,7 @@
 from aiogram.dispatcher.filters import Text
 from aiogram.dispatcher.filters.state import State, StatesGroup
 
-from PostCardBot.core import config
+from PostCardBot.core import config, keyboards
 from PostCardBot.core.decorators import Handler, superuser_only
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.core.model import User
@@ -64,6 +64,11 @@ def get_user_detail(user):
 
     @staticmethod
     def get_options():
+        return keyboards.get("administrators")
+
+    @staticmethod
+    @keyboards.register("administrators")
+    def build_options(role):
         btn_cls = AdministratorHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
@@ -0,0 +1,156 @@
+"""Export handler."""
+
+import asyncio
+import enum
+import os
+from datetime import datetime
+
+from aiogram import types
+from aiogram.dispatcher.filters import Text
+from aiogram.types import CallbackQuery
+from aiogram.utils.exceptions import MessageNotModified
+
+from loguru import logger
+
+from PostCardBot.core import config, export, tasks
+from PostCardBot.core.decorators import Handler, admin_only
+from PostCardBot.core.handlers import BaseHandler
+
+_ = config.i18n.gettext
+__ = config.i18n.lazy_gettext
+
+# Cancel events of the running exports by admin.
+
+running_exports = {}
+
+
+class ExportHandler(BaseHandler):
+    """Export handler."""
+
+    class Buttons(enum.Enum):
+        """Export buttons."""
+
+        CANCEL = _("❌ Cancel")
+
+    class Texts(enum.Enum):
+        """Export texts."""
+
+        USAGE = _(
+            "Usage: /export {names} [{formats}]\n\n"
+            "For example: /export users csv"
+        )
+        ALREADY_RUNNING = _("Your previous export is still running.")
+        EXPORTING = _("Exporting {name}: {count} of about {total}")
+        EXPORT_DONE = _("Exported {count} {name}.")
+        EXPORT_CANCELLED = _("Export cancelled.")
+        EXPORT_FAILED = _("Export failed.")
+        EXPORT_TOO_LARGE = _(
+            "The export is larger than 50 MB and cannot be sent."
+        )
+
+    @staticmethod
+    def get_cancel_options():
+        return types.InlineKeyboardMarkup().add(
+            types.InlineKeyboardButton(
+                ExportHandler.Buttons.CANCEL.value,
+                callback_data="cancel_export",
+            )
+        )
+
+    @Handler.message_handler(commands=["export"])
+    @admin_only
+    async def export_command(message: types.Message):
+        """Export command handler."""
+
+        texts = ExportHandler.Texts
+        args = message.get_args().split()
+        name = args[0] if args else None
+        export_format = args[1] if len(args) > 1 else "csv"
+        if name not in export.EXPORTS or export_format not in export.FORMATS:
+            await message.answer(
+                texts.USAGE.value.format(
+                    names="|".join(export.EXPORTS),
+                    formats="|".join(export.FORMATS),
+                )
+            )
+            return
+        if message.from_user.id in running_exports:
+            await message.answer(texts.ALREADY_RUNNING.value)
+            return
+
+        cancelled = running_exports[message.from_user.id] = asyncio.Event()
+        try:
+            total = await export.EXPORTS[name].count()
+        except Exception:
+            # Time-series collections have no estimated count on some
+            # servers.
+            total = "?"
+        status = await message.answer(
+            texts.EXPORTING.value.format(name=name, count=0, total=total),
+            reply_markup=ExportHandler.get_cancel_options(),
+        )
+        tasks.spawn(
+            ExportHandler.run_export(
+                message, status, name, export_format, cancelled, total
+            ),
+            name=f"export-{message.from_user.id}",
+        )
+
+    @staticmethod
+    async def run_export(
+        message, status, name, export_format, cancelled, total
+    ):
+        """Export a collection and send it as a document."""
+
+        texts = ExportHandler.Texts
+
+        async def progress(count):
+            try:
+                await status.edit_text(
+                    texts.EXPORTING.value.format(
+                        name=name, count=count, total=total
+                    ),
+                    reply_markup=ExportHandler.get_cancel_options(),
+                )
+            except MessageNotModified:
+                pass
+
+        path = None
+        try:
+            path, count = await export.export(
+                name, export_format, cancelled, progress
+            )
+            await status.edit_text(
+                texts.EXPORT_DONE.value.format(count=count, name=name)
+            )
+            if os.path.getsize(path) > export.UPLOAD_LIMIT:
+                await message.answer(texts.EXPORT_TOO_LARGE.value)
+                return
+
+            await message.answer_chat_action("upload_document")
+            await message.answer_document(
+                types.InputFile(
+                    path,
+                    filename=f"{name}-{datetime.utcnow():%Y-%m-%d}"
+                    f".{export_format}.gz",
+                )
+            )
+        except export.ExportCancelled:
+            await status.edit_text(texts.EXPORT_CANCELLED.value)
+        except Exception:
+            logger.exception(f"Failed to export {name}.")
+            await status.edit_text(texts.EXPORT_FAILED.value)
+        finally:
+            running_exports.pop(message.from_user.id, None)
+            if path:
+                os.remove(path)
+
+    @Handler.callback_query_handler(Text(equals="cancel_export"))
+    @admin_only
+    async def cancel_export(call: CallbackQuery):
+        """Cancel the running export of the admin."""
+
+        cancelled = running_exports.get(call.from_user.id)
+        if cancelled:
+            cancelled.set()
+        await call.answer()
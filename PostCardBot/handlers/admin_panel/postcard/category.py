@@ -10,7 +10,7 @@
 from bson import ObjectId
 from loguru import logger
 
-from PostCardBot.core import config
+from PostCardBot.core import catalog, config, keyboards
 from PostCardBot.core.decorators import Handler, admin_only
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.models import Category
@@ -104,6 +104,32 @@ def get_options(category):
             ],
         )
 
+    @staticmethod
+    @keyboards.register("categories")
+    def build_options(role):
+        btn_cls = CategoryHandler.Buttons
+        button_markup = types.ReplyKeyboardMarkup(
+            resize_keyboard=True, selective=True
+        )
+        button_markup.add(
+            types.KeyboardButton(__(btn_cls.ADD_CATEGORY.value)),
+        )
+        button_markup.add(
+            types.KeyboardButton(__(btn_cls.BACK.value)),
+        )
+        return button_markup
+
+    @staticmethod
+    @keyboards.register("category_actions")
+    def build_action_options(role):
+        btn_cls = CategoryHandler.Buttons
+        markup = types.ReplyKeyboardMarkup(
+            resize_keyboard=True, one_time_keyboard=True
+        )
+        markup.add(types.KeyboardButton(text=btn_cls.ADD_CATEGORY.value))
+        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        return markup
+
     @staticmethod
     @admin_only
     async def save_updated_data(message, state):
@@ -111,19 +137,11 @@ async def save_updated_data(message, state):
 
         async with state.proxy() as data:
             category = await data["category"].save()
-
-            btn_cls = CategoryHandler.Buttons
-
-            markup = types.ReplyKeyboardMarkup(
-                resize_keyboard=True, one_time_keyboard=True
-            )
-
-            for button in [btn_cls.ADD_CATEGORY.value, btn_cls.BACK.value]:
-                markup.add(types.KeyboardButton(text=button))
+            await catalog.refresh()
 
             await message.answer(
                 CategoryHandler.Texts.CATEGORY_EDITED.value,
-                reply_markup=markup,
+                reply_markup=keyboards.get("category_actions"),
             )
             await message.answer(
                 text=__(category.name) + "\n\n" + category.description,
@@ -155,15 +173,9 @@ async def cancel(message: types.Message, state: FSMContext):
 
         await state.finish()
 
-        btn_cls = CategoryHandler.Buttons
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_CATEGORY.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
-
         await message.answer(
-            CategoryHandler.Texts.OPERAION_CANCELLED.value, reply_markup=markup
+            CategoryHandler.Texts.OPERAION_CANCELLED.value,
+            reply_markup=keyboards.get("category_actions"),
         )
 
     @Handler.message_handler(commands="skip", state=CategoryEditForm.name)
@@ -201,17 +213,9 @@ async def skip_edit_description(message: types.Message, state: FSMContext):
     async def categories(message: types.Message):
         """Postcards command handler."""
 
-        btn_cls = CategoryHandler.Buttons
-        button_markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, selective=True
-        )
-        button_markup.add(
-            types.KeyboardButton(__(btn_cls.ADD_CATEGORY.value)),
-        )
-        button_markup.add(
-            types.KeyboardButton(__(btn_cls.BACK.value)),
+        await message.answer(
+            text=_("Categories"), reply_markup=keyboards.get("categories")
         )
-        await message.answer(text=_("Categories"), reply_markup=button_markup)
         for category in await Category.all():
             await message.answer(
                 text=md.bold(category.name)
@@ -230,6 +234,7 @@ async def change_status(callback_query: types.CallbackQuery):
         category = await Category(_id=category_id).get()
         category.is_active = not category.is_active
         await category.save()
+        await catalog.refresh()
 
         await Bot.get_current().edit_message_reply_markup(
             chat_id=callback_query.message.chat.id,
@@ -278,6 +283,7 @@ async def process_category_description(
             category = await Category(
                 name=data["name"], description=data["description"]
             ).save()
+            await catalog.refresh()
 
             await message.answer(
                 text=__(category.name) + "\n\n" + category.description,
@@ -287,15 +293,9 @@ async def process_category_description(
 
         await state.finish()
 
-        btn_cls = CategoryHandler.Buttons
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_CATEGORY.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
-
         await message.answer(
-            CategoryHandler.Texts.CATEGORY_ADDED.value, reply_markup=markup
+            CategoryHandler.Texts.CATEGORY_ADDED.value,
+            reply_markup=keyboards.get("category_actions"),
         )
 
     @Handler.callback_query_handler(Text(startswith="edit_category:"))
@@ -359,15 +359,9 @@ async def process_edit_description(
 
         await state.finish()
 
-        btn_cls = CategoryHandler.Buttons
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_CATEGORY.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
-
         await message.answer(
-            CategoryHandler.Texts.CATEGORY_EDITED.value, reply_markup=markup
+            CategoryHandler.Texts.CATEGORY_EDITED.value,
+            reply_markup=keyboards.get("category_actions"),
         )
 
     @Handler.callback_query_handler(Text(startswith="delete_category:"))
@@ -410,6 +404,7 @@ async def confirm_delete(callback_query: types.CallbackQuery):
         bot = Bot.get_current()
         if category:
             await category.delete()
+            await catalog.refresh()
             await bot.edit_message_text(
                 text=CategoryHandler.Texts.CATEGORY_DELETED.value,
                 chat_id=callback_query.message.chat.id,
@@ -1,7 +1,9 @@
 """Admin panel handler."""
 
+import asyncio
 import enum
-from io import BytesIO
+import json
+from collections import deque
 
 import aiogram.utils.markdown as md
 from aiogram import Bot, Dispatcher, types
@@ -11,9 +13,14 @@
 
 from bson import ObjectId
 from loguru import logger
-from PIL import Image
 
-from PostCardBot.core import config
+from PostCardBot.core import catalog, config, keyboards
+from PostCardBot.core.assets import (
+    process_image,
+    schedule_contact_sheet,
+    schedule_postcard_image,
+    warn_duplicates,
+)
 from PostCardBot.core.decorators import Handler, admin_only
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.models import Category, PostCard
@@ -38,6 +45,28 @@ class PostCardEditForm(StatesGroup):
     image = State()
 
 
+class PostCardLayoutForm(StatesGroup):
+    """PostCard layout form."""
+
+    layout = State()
+
+
+class PostCardAlbumForm(StatesGroup):
+    """PostCard album form."""
+
+    photos = State()
+
+
+# Photos of albums that are still arriving, by chat and media group id.
+
+albums = {}
+
+# Recently processed albums, so photos that arrive after the collect delay
+# are reported instead of dropped.
+
+closed_albums = deque(maxlen=100)
+
+
 class AdminPanelPostCardsHandler(BaseHandler):
     """Admin panel handler."""
 
@@ -46,12 +75,14 @@ class Buttons(enum.Enum):
 
         POSTCARDS = _("📦 Postcards")
         ADD_POSTCARD = _("➕📦 Add postcard")
+        ADD_ALBUM = _("➕🗂 Add album")
         EDIT = "📝 Edit"
         DELETE = "🗑 Delete"
         YES = "✅ Yes, delete"
         NO = "❌ No, cancel"
         ACTIVATE = "✅ Activate"
         DEACTIVATE = "❌ Deactivate"
+        LAYOUT = "🔤 Layout"
         BACK = _("🔙📁 Back to categories")
 
     class Texts(enum.Enum):
@@ -68,6 +99,19 @@ class Texts(enum.Enum):
         ENTER_POSTCARD_IMAGE = _("Send postcard image")
         POSTCARD_ADDED = _("Postcard added successfully.")
 
+        SEND_ALBUM = _(
+            "Send an album of up to 10 postcard images. The first line of "
+            "a caption is the postcard name, the rest its description.\n\n"
+            "type /cancel to cancel."
+        )
+        PROCESSING_ALBUM = _("Processing {count} postcard images...")
+        ALBUM_ADDED = _("{count} postcards added successfully.")
+        ALBUM_FAILED = _("{count} images could not be processed: {names}")
+        ALBUM_PHOTO_LATE = _(
+            "This photo arrived after its album was processed and was not "
+            "added. Please send it again in a new album."
+        )
+
         EDIT_NAME = _(
             "{name}\n\nEnter new postcard name\n\ntype "
             "/cancel to cancel /skip to skip changing name."
@@ -87,6 +131,14 @@ class Texts(enum.Enum):
         CONFIRM_DELETE = _("Are you sure you want to delete postcard {name}?")
         POSTCARD_DELETED = _("Postcard {name} deleted successfully.")
 
+        EDIT_LAYOUT = _(
+            "Current text layout:\n\n`{layout}`\n\nSend the new layout as "
+            "JSON. Boxes are `[left, top, right, bottom]` fractions of the "
+            "image size.\n\ntype /cancel to cancel."
+        )
+        INVALID_LAYOUT = _("Invalid layout: {error}\n\nPlease try again.")
+        LAYOUT_EDITED = _("Postcard layout edited successfully.")
+
     @staticmethod
     def get_options(postcard):
         btn_cls = AdminPanelPostCardsHandler.Buttons
@@ -104,50 +156,60 @@ def get_options(postcard):
                 ],
                 [
                     types.InlineKeyboardButton(
-                        text=btn_cls.DEACTIVATE.value
-                        if postcard.is_active
-                        else btn_cls.ACTIVATE.value,
+                        text=(
+                            btn_cls.DEACTIVATE.value
+                            if postcard.is_active
+                            else btn_cls.ACTIVATE.value
+                        ),
                         callback_data="change_postcard_status:"
                         + str(postcard.pk),
-                    )
+                    ),
+                    types.InlineKeyboardButton(
+                        text=btn_cls.LAYOUT.value,
+                        callback_data="edit_postcard_layout:"
+                        + str(postcard.pk),
+                    ),
                 ],
             ]
         )
 
+    @staticmethod
+    @keyboards.register("postcard_actions")
+    def build_action_options(role):
+        btn_cls = AdminPanelPostCardsHandler.Buttons
+        markup = types.ReplyKeyboardMarkup(
+            resize_keyboard=True, one_time_keyboard=True
+        )
+        markup.add(
+            types.KeyboardButton(text=btn_cls.ADD_POSTCARD.value),
+            types.KeyboardButton(text=btn_cls.ADD_ALBUM.value),
+        )
+        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        return markup
+
     @staticmethod
     async def save_updated_data(message, state):
         async with state.proxy() as data:
-            if message.text != "/skip":
+            image_changed = message.text != "/skip"
+            if image_changed:
                 data["image"] = message.photo[-1].file_id
-                image_byte = BytesIO()
-                out_image = BytesIO()
-                await message.photo[-1].download(destination_file=image_byte)
-
-                image = Image.open(image_byte)
-                image.thumbnail((300, 300))
-                image.save(out_image, format="PNG")
-                out_image.seek(0)
-
-                bot = Bot.get_current()
-
-                thumbnail_message = await bot.send_photo(
-                    chat_id=message.chat.id,
-                    photo=out_image,
-                )
-                data["thumbnail"] = thumbnail_message.photo[-1].file_id
-                await bot.delete_message(
-                    chat_id=thumbnail_message.chat.id,
-                    message_id=thumbnail_message.message_id,
-                )
+                # Generated in the background once the postcard is saved.
+                data["renditions"] = None
+                data["thumbnail"] = None
+                data["content_hash"] = None
             old_postcard = data.pop("postcard", None)
             if old_postcard:
                 for key, value in old_postcard.to_dict().items():
                     data.setdefault(key, value)
 
             postcard = await PostCard(**data).save()
+            await catalog.refresh()
+            # The contact sheet is rebuilt once the new image is processed.
+            if image_changed:
+                schedule_postcard_image(postcard, message.chat.id)
 
             await message.answer_photo(
-                photo=postcard.thumbnail,
+                photo=postcard.get_rendition(config.RENDITION_BROWSE_SIZE),
                 caption=postcard.name + "\n\n" + postcard.description,
                 reply_markup=AdminPanelPostCardsHandler.get_options(postcard),
                 parse_mode=types.ParseMode.MARKDOWN,
@@ -156,7 +218,13 @@ async def save_updated_data(message, state):
             return postcard
 
     @Handler.message_handler(
-        commands=["cancel"], state=[PostCardAddForm, PostCardEditForm]
+        commands=["cancel"],
+        state=[
+            PostCardAddForm,
+            PostCardEditForm,
+            PostCardLayoutForm,
+            PostCardAlbumForm,
+        ],
     )
     @admin_only
     async def cancel_handler(message: types.Message, state: FSMContext):
@@ -191,7 +259,7 @@ async def skip_description_edit(message: types.Message, state: FSMContext):
         await PostCardEditForm.next()
         async with state.proxy() as data:
             await message.answer_photo(
-                data["postcard"].thumbnail,
+                data["postcard"].get_rendition(config.RENDITION_BROWSE_SIZE),
                 caption=AdminPanelPostCardsHandler.Texts.EDIT_IMAGE.value,
                 parse_mode=types.ParseMode.MARKDOWN,
             )
@@ -205,13 +273,7 @@ async def skip_image_edit(message: types.Message, state: FSMContext):
 
         await state.finish()
 
-        btn_cls = AdminPanelPostCardsHandler.Buttons
-
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_POSTCARD.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        markup = keyboards.get("postcard_actions")
 
         await message.answer(
             AdminPanelPostCardsHandler.Texts.POSTCARD_EDITED.value,
@@ -235,13 +297,7 @@ async def postcards(callback_query: types.CallbackQuery):
 
         bot = Bot.get_current()
 
-        btn_cls = AdminPanelPostCardsHandler.Buttons
-
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_POSTCARD.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        markup = keyboards.get("postcard_actions")
 
         if postcards:
             await bot.send_message(
@@ -257,7 +313,7 @@ async def postcards(callback_query: types.CallbackQuery):
             for postcard in postcards:
                 await bot.send_photo(
                     chat_id=callback_query.message.chat.id,
-                    photo=postcard.thumbnail,
+                    photo=postcard.get_rendition(config.RENDITION_BROWSE_SIZE),
                     caption=postcard.name + "\n\n" + postcard.description,
                     reply_markup=AdminPanelPostCardsHandler.get_options(
                         postcard
@@ -357,12 +413,7 @@ async def process_postcard_image(
             message, state
         )
         PostCardAddForm.next()
-        btn_cls = AdminPanelPostCardsHandler.Buttons
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_POSTCARD.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        markup = keyboards.get("postcard_actions")
 
         await message.answer(
             AdminPanelPostCardsHandler.Texts.POSTCARD_ADDED.value,
@@ -371,6 +422,123 @@ async def process_postcard_image(
 
         logger.info("Added postcard %s" % postcard.name)
 
+    @Handler.message_handler(Text(equals=__(Buttons.ADD_ALBUM.value)))
+    @admin_only
+    async def add_album(message: types.Message, state: FSMContext):
+        """Add postcards from an album."""
+
+        async with state.proxy() as data:
+            category = data.get("category")
+        if not category:
+            await message.answer(
+                AdminPanelPostCardsHandler.Texts.NO_CATEGORY_SELECTED.value,
+                parse_mode=types.ParseMode.MARKDOWN,
+            )
+            return
+
+        await PostCardAlbumForm.photos.set()
+        async with state.proxy() as data:
+            data["category_id"] = category.pk
+
+        await message.answer(
+            AdminPanelPostCardsHandler.Texts.SEND_ALBUM.value,
+            reply_markup=types.ReplyKeyboardRemove(),
+        )
+
+    @Handler.message_handler(
+        lambda message: (message.chat.id, message.media_group_id)
+        in closed_albums,
+        content_types=types.ContentType.PHOTO,
+        state="*",
+    )
+    @admin_only
+    async def late_album_photo(message: types.Message):
+        """Report a photo of an album that was already processed."""
+
+        await message.reply(
+            AdminPanelPostCardsHandler.Texts.ALBUM_PHOTO_LATE.value
+        )
+
+    @Handler.message_handler(
+        content_types=types.ContentType.PHOTO, state=PostCardAlbumForm.photos
+    )
+    @admin_only
+    async def process_album_photo(message: types.Message, state: FSMContext):
+        """Collect the photos of an album and add them as postcards."""
+
+        # Every photo of an album is a separate update. The first one waits
+        # for the rest and handles the whole album.
+        key = (message.chat.id, message.media_group_id or message.message_id)
+        if key in albums:
+            albums[key].append(message)
+            return
+
+        albums[key] = [message]
+        await asyncio.sleep(config.ALBUM_COLLECT_DELAY)
+        messages = sorted(albums.pop(key), key=lambda m: m.message_id)
+        if message.media_group_id:
+            closed_albums.append(key)
+
+        async with state.proxy() as data:
+            category_id = data["category_id"]
+        await state.finish()
+
+        await message.answer(
+            AdminPanelPostCardsHandler.Texts.PROCESSING_ALBUM.value.format(
+                count=len(messages)
+            )
+        )
+        results = await asyncio.gather(
+            *(
+                process_image(photo.photo[-1].file_id, message.chat.id)
+                for photo in messages
+            ),
+            return_exceptions=True,
+        )
+
+        postcards = []
+        failed = []
+        for photo, fields in zip(messages, results):
+            name, _sep, description = (photo.caption or "").partition("\n")
+            name = name.strip() or photo.photo[-1].file_unique_id
+            if isinstance(fields, Exception):
+                logger.opt(exception=fields).error(
+                    f"Failed to process album image {name}."
+                )
+                failed.append(name)
+                continue
+            postcards.append(
+                PostCard(
+                    name=name,
+                    description=description.strip(),
+                    category_id=category_id,
+                    image=photo.photo[-1].file_id,
+                    **fields,
+                )
+            )
+        if failed:
+            await message.answer(
+                AdminPanelPostCardsHandler.Texts.ALBUM_FAILED.value.format(
+                    count=len(failed), names=", ".join(failed)
+                )
+            )
+        if postcards:
+            await PostCard.bulk_create(postcards)
+            await catalog.refresh()
+            schedule_contact_sheet(category_id, message.chat.id)
+            for postcard in postcards:
+                await warn_duplicates(postcard, message.chat.id)
+
+        markup = keyboards.get("postcard_actions")
+
+        await message.answer(
+            AdminPanelPostCardsHandler.Texts.ALBUM_ADDED.value.format(
+                count=len(postcards)
+            ),
+            reply_markup=markup,
+        )
+        logger.info("Added %s postcards from an album" % len(postcards))
+
     @Handler.callback_query_handler(
         lambda callback_query: callback_query.data.startswith(
             "change_postcard_status:"
@@ -385,6 +553,10 @@ async def change_postcard_status(callback_query: types.CallbackQuery):
         ).get()
         postcard.is_active = not postcard.is_active
         await postcard.save()
+        await catalog.refresh()
+        schedule_contact_sheet(
+            postcard.category_id, callback_query.message.chat.id
+        )
 
         await Bot.get_current().edit_message_reply_markup(
             chat_id=callback_query.message.chat.id,
@@ -453,7 +625,7 @@ async def process_edit_postcard_description(
 
         await PostCardEditForm.image.set()
         await message.answer_photo(
-            photo=data["postcard"].thumbnail,
+            photo=data["postcard"].get_rendition(config.RENDITION_BROWSE_SIZE),
             caption=AdminPanelPostCardsHandler.Texts.EDIT_IMAGE.value,
             reply_markup=types.ReplyKeyboardRemove(),
             parse_mode=types.ParseMode.MARKDOWN,
@@ -470,12 +642,7 @@ async def process_edit_postcard_image(
 
         await AdminPanelPostCardsHandler.save_updated_data(message, state)
 
-        btn_cls = AdminPanelPostCardsHandler.Buttons
-        markup = types.ReplyKeyboardMarkup(
-            resize_keyboard=True, one_time_keyboard=True
-        )
-        markup.add(types.KeyboardButton(text=btn_cls.ADD_POSTCARD.value))
-        markup.add(types.KeyboardButton(text=btn_cls.BACK.value))
+        markup = keyboards.get("postcard_actions")
 
         await message.answer(
             AdminPanelPostCardsHandler.Texts.POSTCARD_ADDED.value,
@@ -483,6 +650,61 @@ async def process_edit_postcard_image(
             parse_mode=types.ParseMode.MARKDOWN,
         )
 
+    @Handler.callback_query_handler(Text(startswith="edit_postcard_layout:"))
+    @admin_only
+    async def edit_postcard_layout(callback_query: types.CallbackQuery):
+        """Edit postcard text layout."""
+
+        postcard = await PostCard(
+            _id=ObjectId(callback_query.data.split(":")[1])
+        ).get()
+        await PostCardLayoutForm.layout.set()
+
+        state = Dispatcher.get_current().current_state()
+        async with state.proxy() as data:
+            data["postcard"] = postcard
+
+        await callback_query.answer()
+        await Bot.get_current().send_message(
+            chat_id=callback_query.message.chat.id,
+            text=AdminPanelPostCardsHandler.Texts.EDIT_LAYOUT.value.format(
+                layout=json.dumps(postcard.get_layout(), ensure_ascii=False)
+            ),
+            reply_markup=types.ReplyKeyboardRemove(),
+            parse_mode=types.ParseMode.MARKDOWN,
+        )
+
+    @Handler.message_handler(
+        content_types=types.ContentType.TEXT, state=PostCardLayoutForm.layout
+    )
+    @admin_only
+    async def process_postcard_layout(
+        message: types.Message, state: FSMContext
+    ):
+        """Postcard layout."""
+
+        try:
+            layout = PostCard.validate_layout(json.loads(message.text))
+        except ValueError as error:
+            await message.answer(
+                AdminPanelPostCardsHandler.Texts.INVALID_LAYOUT.value.format(
+                    error=error
+                )
+            )
+            return
+
+        async with state.proxy() as data:
+            postcard = await PostCard(
+                _id=data["postcard"].pk, layout=layout
+            ).save()
+        await catalog.refresh()
+
+        await state.finish()
+        await message.answer(
+            AdminPanelPostCardsHandler.Texts.LAYOUT_EDITED.value,
+        )
+        logger.info("Edited layout of postcard %s" % postcard.name)
+
     @Handler.callback_query_handler(Text(startswith="delete_postcard:"))
     @admin_only
     async def delete_postcard(callback_query: types.CallbackQuery):
@@ -520,6 +742,10 @@ async def confirm_delete_postcard(callback_query: types.CallbackQuery):
             _id=ObjectId(callback_query.data.split(":")[1])
         ).get()
         await postcard.delete()
+        await catalog.refresh()
+        schedule_contact_sheet(
+            postcard.category_id, callback_query.message.chat.id
+        )
 
         await Bot.get_current().edit_message_caption(
             chat_id=callback_query.message.chat.id,
@@ -1,17 +1,26 @@
 """Stats handler."""
 
 import enum
-import io
 
 from aiogram import types
 from aiogram.dispatcher.filters import Text
 
-import matplotlib.pyplot as plt
-
-from PostCardBot.core import config
+from PostCardBot.core import (
+    activity,
+    charts,
+    config,
+    events,
+    hll,
+    keyboards,
+    rollup,
+)
 from PostCardBot.core.decorators import Handler, admin_only, superuser_only
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.core.model import User
+from PostCardBot.core.rollup import day_key
+from PostCardBot.core.scheduler import RenderScheduler
+from PostCardBot.core.stats import send_stats, user_growth
+from PostCardBot.models import Category, DailyStats, PostCard, SendEvent
 
 _ = config.i18n.gettext
 __ = config.i18n.lazy_gettext
@@ -26,6 +35,7 @@ class Buttons(enum.Enum):
         USERS = _("👥📈 Users")
         ADMINISTRATORS = _("👤📈 Administrators")
         POSTCARDS = _("📦📈 Postcards")
+        RENDER_QUEUE = _("⚙️📈 Render queue")
         STATS = _("📊 Stats")
         BACK = _("🔙🔐 Admin panel")
 
@@ -34,18 +44,47 @@ class Buttons(enum.Enum):
     async def stats(message: types.Message):
         """Stats command handler."""
 
+        today = await DailyStats(_id=day_key()).get() or DailyStats()
+        await message.answer(
+            text=_(
+                "Stats\n\n"
+                "Today\n"
+                "New users: {new_users}\n"
+                "Postcards sent: {sends}\n"
+                "Renders: {renders}\n"
+                "Canceled sends: {cancels}"
+            ).format(**today.to_dict())
+            + "\n\n"
+            + _(
+                "Active users (±{error:.1%})\n"
+                "Daily: {dau}\n"
+                "Weekly: {wau}\n"
+                "Monthly: {mau}"
+            ).format(
+                error=hll.ERROR,
+                dau=await activity.active_users(1),
+                wau=await activity.active_users(7),
+                mau=await activity.active_users(30),
+            ),
+            reply_markup=keyboards.get("stats", message.from_user),
+        )
+
+    @staticmethod
+    @keyboards.register("stats")
+    def build_options(role):
         btn_cls = StatsHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
         )
         button_markup.add(types.KeyboardButton(__(btn_cls.POSTCARDS.value)))
         button_markup.add(types.KeyboardButton(__(btn_cls.USERS.value)))
-        if message.from_user.is_superuser:
+        button_markup.add(types.KeyboardButton(__(btn_cls.RENDER_QUEUE.value)))
+        if role == keyboards.SUPERUSER:
             button_markup.add(
                 types.KeyboardButton(__(btn_cls.ADMINISTRATORS.value))
             )
         button_markup.add(types.KeyboardButton(__(btn_cls.BACK.value)))
-        await message.answer(text=_("Stats"), reply_markup=button_markup)
+        return button_markup
 
     @Handler.message_handler(Text(equals=__(Buttons.USERS.value)))
     @admin_only
@@ -53,33 +92,38 @@ async def users(message: types.Message):
         """Users command handler."""
 
         total_user = await User.count()
-        # Aggregate users by date
-        users = await User.all()
-        users_by_date = {}
-        for user in users:
-            created = user.created.strftime("%Y-%m-%d")
-            if created not in users_by_date:
-                users_by_date[created] = 1
-            else:
-                users_by_date[created] += 1
+        dates, new_users, total_users = await user_growth()
 
         stats = _("Total users: {}").format(total_user)
-        bio = io.BytesIO()
-        plt.plot(
-            users_by_date.keys(),
-            users_by_date.values(),
-            color="red",
-            linewidth=2,
-            linestyle="-",
-            marker="o",
+        stats += "\n" + _("New users in the last {days} days: {count}").format(
+            days=len(dates), count=sum(new_users)
+        )
+        await charts.answer_chart(
+            message,
+            ("users", dates[0], dates[-1]),
+            rollup.version,
+            {
+                "title": _("Users by date"),
+                "xlabel": _("Date"),
+                "ylabel": _("Users"),
+                "labels": [day.isoformat() for day in dates],
+                "series": [
+                    {
+                        "kind": "bar",
+                        "label": _("New users"),
+                        "values": new_users,
+                        "color": "orange",
+                    },
+                    {
+                        "kind": "line",
+                        "label": _("Users"),
+                        "values": total_users,
+                        "color": "red",
+                    },
+                ],
+            },
+            caption=stats,
         )
-        plt.title(_("Users by date"))
-        plt.ylabel(_("Users"))
-        plt.xlabel(_("Date"))
-        plt.tight_layout()
-        plt.savefig(bio, format="png")
-        bio.seek(0)
-        await message.answer_photo(bio, caption=stats)
 
     @Handler.message_handler(Text(equals=__(Buttons.ADMINISTRATORS.value)))
     @superuser_only
@@ -93,4 +137,75 @@ async def admins(message: types.Message):
     async def postcards(message: types.Message):
         """Postcards command handler."""
 
-        await message.answer(text=_("Postcards"))
+        stats = await send_stats()
+        actions = stats["actions"]
+        previews = actions.get(SendEvent.PREVIEW, 0)
+        confirms = actions.get(SendEvent.CONFIRM, 0)
+        postcard_names = await PostCard.field_values(
+            "name", _id={"$in": [pk for pk, _count in stats["postcards"]]}
+        )
+        category_names = await Category.field_values(
+            "name", _id={"$in": [pk for pk, _count in stats["categories"]]}
+        )
+
+        lines = [
+            _("Postcards sent in the last {days} days: {count}").format(
+                days=len(stats["dates"]), count=sum(stats["sends"])
+            ),
+            _("Previews: {previews}, canceled: {cancels}").format(
+                previews=previews, cancels=actions.get(SendEvent.CANCEL, 0)
+            ),
+            _("Preview to send conversion: {rate:.0%}").format(
+                rate=confirms / previews if previews else 0
+            ),
+            "",
+            _("Most sent postcards"),
+        ]
+        lines += [
+            f"{postcard_names.get(pk, pk)}: {count}"
+            for pk, count in stats["postcards"]
+        ]
+        lines += ["", _("Most sent categories")]
+        lines += [
+            f"{category_names.get(pk, pk)}: {count}"
+            for pk, count in stats["categories"]
+        ]
+
+        await charts.answer_chart(
+            message,
+            ("sends", stats["dates"][0], stats["dates"][-1]),
+            events.version,
+            {
+                "title": _("Postcards by date"),
+                "xlabel": _("Date"),
+                "ylabel": _("Postcards"),
+                "labels": [day.isoformat() for day in stats["dates"]],
+                "series": [
+                    {
+                        "kind": "bar",
+                        "label": _("Postcards sent"),
+                        "values": stats["sends"],
+                        "color": "steelblue",
+                    },
+                ],
+            },
+            caption="\n".join(lines),
+        )
+
+    @Handler.message_handler(Text(equals=__(Buttons.RENDER_QUEUE.value)))
+    @admin_only
+    async def render_queue(message: types.Message):
+        """Render queue command handler."""
+
+        metrics = RenderScheduler().metrics()
+        await message.answer(
+            text=_(
+                "Queued renders: {depth}/{capacity}\n"
+                "Running renders: {running}\n"
+                "Completed renders: {completed}\n"
+                "Rejected renders: {rejected}\n\n"
+                "Average wait: {wait_avg:.2f}s\n"
+                "95th percentile wait: {wait_p95:.2f}s\n"
+                "Longest wait: {wait_max:.2f}s"
+            ).format(**metrics)
+        )
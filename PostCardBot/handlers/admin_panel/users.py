@@ -5,7 +5,7 @@
 from aiogram import types
 from aiogram.dispatcher.filters import Text
 
-from PostCardBot.core import config
+from PostCardBot.core import config, keyboards
 from PostCardBot.core.decorators import Handler, admin_only
 from PostCardBot.core.handlers import BaseHandler
 
@@ -27,6 +27,13 @@ class Buttons(enum.Enum):
     async def users(message: types.Message):
         """Users command handler."""
 
+        await message.answer(
+            text=_("Users"), reply_markup=keyboards.get("users")
+        )
+
+    @staticmethod
+    @keyboards.register("users")
+    def build_options(role):
         btn_cls = AdminPanelUsersHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
@@ -34,4 +41,4 @@ async def users(message: types.Message):
         button_markup.add(
             types.KeyboardButton(__(btn_cls.BACK.value)),
         )
-        await message.answer(text=_("Users"), reply_markup=button_markup)
+        return button_markup
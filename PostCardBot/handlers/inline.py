@@ -0,0 +1,75 @@
+"""Inline postcards handler."""
+
+from collections import OrderedDict
+
+from aiogram import types
+
+from PostCardBot.core import catalog, config, search
+from PostCardBot.core.decorators import Handler
+from PostCardBot.core.handlers import BaseHandler
+
+# Inline results by catalog version and normalized query, least recently
+# used first.
+
+results_cache = OrderedDict()
+
+
+class InlinePostCardHandler(BaseHandler):
+    """Inline postcards handler."""
+
+    @staticmethod
+    def build_result(postcard):
+        """Build the inline result of a postcard."""
+
+        return types.InlineQueryResultCachedPhoto(
+            id=str(postcard.pk),
+            photo_file_id=postcard.get_rendition(config.RENDITION_BROWSE_SIZE),
+            title=postcard.name,
+            description=postcard.description,
+            caption=postcard.name,
+        )
+
+    @staticmethod
+    async def get_results(query):
+        """
+        Get the inline results of a query.
+
+        Results are built once per catalog version, so repeated queries are
+        answered from memory. An empty query lists all postcards.
+        """
+
+        current_catalog = catalog.get_catalog()
+        key = (current_catalog.version, " ".join(search.tokenize(query)))
+        results = results_cache.get(key)
+        if results is not None:
+            results_cache.move_to_end(key)
+            return results
+
+        if key[1]:
+            postcards = await search.find(query, current_catalog)
+        else:
+            postcards = sorted(
+                current_catalog.postcard_index.values(),
+                key=lambda postcard: current_catalog.ranks[postcard.pk],
+            )
+        results = results_cache[key] = tuple(
+            InlinePostCardHandler.build_result(postcard)
+            for postcard in postcards
+        )
+        while len(results_cache) > config.INLINE_CACHE_SIZE:
+            results_cache.popitem(last=False)
+        return results
+
+    @Handler.inline_handler()
+    async def inline_query_handler(inline_query: types.InlineQuery):
+        """Answer an inline query with matching postcards."""
+
+        results = await InlinePostCardHandler.get_results(inline_query.query)
+        offset = inline_query.offset
+        offset = int(offset) if offset.isdigit() else 0
+        end = offset + min(config.INLINE_PAGE_SIZE, 50)
+        await inline_query.answer(
+            list(results[offset:end]),
+            cache_time=config.INLINE_CACHE_TIME,
+            next_offset=str(end) if end < len(results) else "",
+        )
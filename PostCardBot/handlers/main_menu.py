@@ -7,7 +7,7 @@
 from aiogram import types
 from aiogram.dispatcher.filters import Text
 
-from PostCardBot.core import config
+from PostCardBot.core import config, keyboards
 from PostCardBot.core.decorators import Handler, admin_only
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.handlers.settings import SettingsHandler
@@ -76,6 +76,11 @@ class Texts(enum.Enum):
         )
 
     def get_options(user):
+        return keyboards.get("main_menu", user)
+
+    @staticmethod
+    @keyboards.register("main_menu")
+    def build_options(role):
         btn_cls = MainMenuHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
@@ -87,7 +92,7 @@ def get_options(user):
         button_markup.add(
             types.KeyboardButton(_(SettingsHandler.Buttons.SETTINGS.value)),
         )
-        if user.is_superuser or user.is_admin:
+        if role in (keyboards.ADMIN, keyboards.SUPERUSER):
             button_markup.add(
                 types.KeyboardButton(_(btn_cls.ADMIN_PANEL.value)),
             )
@@ -130,6 +135,14 @@ async def back(message: types.Message):
     async def admin_panel(message: types.Message):
         """Admin panel command handler."""
 
+        await message.answer(
+            text=_("🔐 Admin panel"),
+            reply_markup=keyboards.get("admin_panel", message.from_user),
+        )
+
+    @staticmethod
+    @keyboards.register("admin_panel")
+    def build_admin_panel_options(role):
         btn_cls = MainMenuHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
@@ -138,16 +151,14 @@ async def admin_panel(message: types.Message):
             types.KeyboardButton(__(btn_cls.CATEGORIES.value)),
             types.KeyboardButton(__(btn_cls.STATS.value)),
         )
-        if message.from_user.is_superuser:
+        if role == keyboards.SUPERUSER:
             button_markup.add(
                 types.KeyboardButton(__(btn_cls.ADMINISTRATORS.value)),
             )
         button_markup.add(
             types.KeyboardButton(__(btn_cls.BACK_MAIN_MENU.value)),
         )
-        await message.answer(
-            text=_("🔐 Admin panel"), reply_markup=button_markup
-        )
+        return button_markup
 
     @Handler.message_handler(Text(equals=__(Buttons.ABOUT.value)))
     async def about(message: types.Message):
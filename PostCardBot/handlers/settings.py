@@ -5,7 +5,7 @@
 from aiogram import types
 from aiogram.dispatcher.filters import Text
 
-from PostCardBot.core import config
+from PostCardBot.core import config, keyboards
 from PostCardBot.core.decorators import Handler
 from PostCardBot.core.handlers import BaseHandler
 from PostCardBot.core.model import User
@@ -28,6 +28,13 @@ class Buttons(enum.Enum):
     async def settings(message: types.Message):
         """Settings command handler."""
 
+        await message.answer(
+            text=_("Settings"), reply_markup=keyboards.get("settings")
+        )
+
+    @staticmethod
+    @keyboards.register("settings")
+    def build_options(role):
         btn_cls = SettingsHandler.Buttons
         button_markup = types.ReplyKeyboardMarkup(
             resize_keyboard=True, selective=True
@@ -38,7 +45,7 @@ async def settings(message: types.Message):
         button_markup.add(
             types.KeyboardButton(_(btn_cls.BACK.value)),
         )
-        await message.answer(text=_("Settings"), reply_markup=button_markup)
+        return button_markup
 
     @Handler.message_handler(Text(equals=__(Buttons.CHANGE_LANGUAGE.value)))
     async def change_language(message: types.Message):
@@ -1,6 +1,8 @@
 """User postcards handler."""
 
 import enum
+import time
+from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.dispatcher import FSMContext
@@ -11,12 +13,18 @@
 from bson import ObjectId
 from loguru import logger
 
-from PostCardBot.core import config
+from PostCardBot.core import catalog, config, counters, events, rollup, search
 from PostCardBot.core.decorators import Handler
 from PostCardBot.core.handlers import BaseHandler
-from PostCardBot.core.helpers import create_postcard
+from PostCardBot.core.helpers import render_postcards
+from PostCardBot.core.jobs import JobFailed, JobTimeout
+from PostCardBot.core.scheduler import (
+    QueueFull,
+    RenderScheduler,
+    UserLimitReached,
+)
 from PostCardBot.handlers.main_menu import MainMenuHandler
-from PostCardBot.models import Category, PostCard
+from PostCardBot.models import HistoryEntry, SendEvent
 
 _ = config.i18n.gettext
 __ = config.i18n.lazy_gettext
@@ -30,6 +38,18 @@ class SendPostCard(StatesGroup):
     confirm = State()
 
 
+# History page buttons carry the creation time of the last entry in
+# milliseconds since this epoch.
+
+HISTORY_EPOCH = datetime(1970, 1, 1)
+
+
+class SearchPostCard(StatesGroup):
+    """Search postcard state."""
+
+    query = State()
+
+
 class UserPostCardHandler(BaseHandler):
     """Settings handler."""
 
@@ -37,7 +57,6 @@ class Buttons(enum.Enum):
         """Settings buttons."""
 
         BACK = _("🔙🏠 Main menu")
-        SEND = _("📬 Use this template")
         SHARE = _("📤 Share")
 
         SEND_POSTCARD = _("📬 Send postcard")
@@ -48,6 +67,9 @@ class Buttons(enum.Enum):
         CONFRIM = _("✅ Confirm")
         CANCEL = _("❌ Cancel")
 
+        OLDER = _("⏬ Older")
+        NEWEST = _("⏫ Newest")
+
     class Texts(enum.Enum):
         """User postcard texts."""
 
@@ -59,15 +81,209 @@ class Texts(enum.Enum):
             "/skip to use default name. /cancel to cancel."
         )
         ENTER_RECEIVER_NAME = _("Enter receiver name\n\n/cancel to cancel.")
+        BATCH_HINT = _(
+            "To send this postcard to several friends at once, write each "
+            "name on its own line (up to {count} names)."
+        )
+        TOO_MANY_RECEIVERS = _(
+            "You can send up to {count} postcards at once. Please try again."
+        )
+        EMPTY_RECEIVER_NAME = _(
+            "Receiver name can not be empty. Please try again."
+        )
 
         CONFIRM_SEND_POSTCARD = "Send this postcard?"
+        CONFIRM_SEND_POSTCARDS = _("Send these {count} postcards?")
         POSTCARD_CAPTION = _("Postcard from")
         POSTCARD_SEND_CANCELED = _("Postcard send canceled")
         POSTCARD_READY = _("Your postcard is ready")
 
         OPERATION_CANCELLED = _("Operation cancelled.")
 
-    @Handler.message_handler(commands=["cancel"], state=SendPostCard)
+        ENTER_SEARCH_QUERY = _(
+            "Enter a postcard name or a word from its description\n\n"
+            "/cancel to cancel."
+        )
+        SEARCH_RESULTS = _("Results for “{query}”: {total}")
+        SEARCH_NOT_FOUND = _("No postcards match “{query}”.")
+
+        MY_POSTCARDS = _("Your postcards, newest first")
+        NO_POSTCARDS_SENT = _("You have not sent any postcards yet.")
+
+        QUEUE_POSITION = _(
+            "Many postcards are being prepared right now. Yours is number "
+            "{position} in the queue, please wait."
+        )
+        QUEUE_FULL = _(
+            "Too many postcards are being prepared right now. Please send "
+            "the receiver name again in a minute."
+        )
+        USER_LIMIT_REACHED = _(
+            "Your previous postcard is still being prepared. Please wait "
+            "for it and send the receiver name again."
+        )
+        RENDER_FAILED = _(
+            "Your postcard could not be prepared. Please send the receiver "
+            "name again."
+        )
+
+    @staticmethod
+    def get_confirm_options():
+        return types.InlineKeyboardMarkup().add(
+            types.InlineKeyboardButton(
+                UserPostCardHandler.Buttons.CONFRIM.value,
+                callback_data="confirm_send_postcard",
+            ),
+            types.InlineKeyboardButton(
+                UserPostCardHandler.Buttons.CANCEL.value,
+                callback_data="cancel_send_postcard",
+            ),
+        )
+
+    @staticmethod
+    async def ask_receiver_name(message):
+        texts = UserPostCardHandler.Texts
+        await message.answer(
+            texts.ENTER_RECEIVER_NAME.value
+            + "\n\n"
+            + texts.BATCH_HINT.value.format(count=config.BATCH_MAX_RECIPIENTS)
+        )
+
+    @staticmethod
+    async def schedule_render(message, priority, factory, postcard):
+        """
+        Queue a render of a postcard and wait for it.
+
+        Returns ``None`` and tells the user why when the render is rejected.
+        """
+
+        texts = UserPostCardHandler.Texts
+        try:
+            job = RenderScheduler().submit(
+                message.from_user.id, priority, factory
+            )
+        except QueueFull:
+            await message.answer(texts.QUEUE_FULL.value)
+            return None
+        except UserLimitReached:
+            await message.answer(texts.USER_LIMIT_REACHED.value)
+            return None
+
+        if job.position:
+            await message.answer(
+                texts.QUEUE_POSITION.value.format(position=job.position)
+            )
+        await message.answer_chat_action("upload_photo")
+        started = time.monotonic()
+        try:
+            renders = await job
+        except (JobFailed, JobTimeout) as error:
+            logger.warning(f"Render of {postcard.pk} failed: {error!r}")
+            await message.answer(texts.RENDER_FAILED.value)
+            return None
+        except Exception:
+            logger.exception(f"Render of {postcard.pk} failed.")
+            await message.answer(texts.RENDER_FAILED.value)
+            return None
+        rollup.record("renders", len(renders))
+        events.record(
+            SendEvent.PREVIEW,
+            postcard,
+            message.from_user.id,
+            quantity=len(renders),
+            render_time=time.monotonic() - started,
+        )
+        return renders
+
+    @staticmethod
+    async def get_search_page(query, page):
+        """Get the text and buttons of a page of search results."""
+
+        texts = UserPostCardHandler.Texts
+        postcards = await search.find(query, catalog.get_catalog())
+        if not postcards:
+            return texts.SEARCH_NOT_FOUND.value.format(query=query), None
+
+        size = config.SEARCH_PAGE_SIZE
+        pages = (len(postcards) + size - 1) // size
+        page %= pages
+        start = page * size
+        markup = types.InlineKeyboardMarkup()
+        for postcard in postcards[start : start + size]:  # noqa: E203
+            markup.row(
+                types.InlineKeyboardButton(
+                    postcard.name, callback_data=f"send_postcard:{postcard.pk}"
+                )
+            )
+        if pages > 1:
+            markup.row(
+                types.InlineKeyboardButton(
+                    catalog.Buttons.PREVIOUS.value,
+                    callback_data=f"search_page:{(page - 1) % pages}",
+                ),
+                types.InlineKeyboardButton(
+                    catalog.Buttons.NEXT.value,
+                    callback_data=f"search_page:{(page + 1) % pages}",
+                ),
+            )
+        text = texts.SEARCH_RESULTS.value.format(
+            query=query, total=len(postcards)
+        )
+        return text, markup
+
+    @staticmethod
+    async def show_search_results(message, state, query):
+        """Answer with the first page of search results."""
+
+        await state.finish()
+        await state.update_data(search_query=query)
+        text, markup = await UserPostCardHandler.get_search_page(query, 0)
+        await message.answer(text, reply_markup=markup)
+
+    @staticmethod
+    async def get_history_page(user_id, before=None):
+        """Get the text and buttons of a page of sent postcards."""
+
+        btn_cls = UserPostCardHandler.Buttons
+        texts = UserPostCardHandler.Texts
+        size = config.HISTORY_PAGE_SIZE
+        entries = await HistoryEntry.seek(size + 1, before, user_id=user_id)
+        if not entries:
+            return texts.NO_POSTCARDS_SENT.value, None
+
+        markup = types.InlineKeyboardMarkup()
+        for entry in entries[:size]:
+            markup.row(
+                types.InlineKeyboardButton(
+                    f"{entry.to_user} · {entry.created:%d.%m.%Y}",
+                    callback_data=f"resend:{entry.pk}",
+                )
+            )
+        buttons = []
+        if before:
+            buttons.append(
+                types.InlineKeyboardButton(
+                    btn_cls.NEWEST.value, callback_data="history:newest"
+                )
+            )
+        if len(entries) > size:
+            last = entries[size - 1]
+            created = (last.created - HISTORY_EPOCH) // timedelta(
+                milliseconds=1
+            )
+            buttons.append(
+                types.InlineKeyboardButton(
+                    btn_cls.OLDER.value,
+                    callback_data=f"history:{created}:{last.pk}",
+                )
+            )
+        if buttons:
+            markup.row(*buttons)
+        return texts.MY_POSTCARDS.value, markup
+
+    @Handler.message_handler(
+        commands=["cancel"], state=[SendPostCard, SearchPostCard]
+    )
     async def cancel_handler(message: types.Message, state: FSMContext):
         """Cancel handler."""
 
@@ -85,60 +301,145 @@ async def skip_from_user(message: types.Message, state: FSMContext):
             data["from_user"] = message.from_user.first_name
 
         await SendPostCard.next()
-        await message.answer(
-            UserPostCardHandler.Texts.ENTER_RECEIVER_NAME.value
-        )
+        await UserPostCardHandler.ask_receiver_name(message)
 
     @Handler.message_handler(Text(equals=__(Buttons.SEND_POSTCARD.value)))
     async def send_postcard_handler(message: types.Message):
         """Settings command handler."""
 
-        # Load categories
-        categories = await Category.filter(is_active=True)
-        inline_markup = types.InlineKeyboardMarkup()
-        for category in categories:
-            inline_markup.row(
-                types.InlineKeyboardButton(
-                    category.name,
-                    callback_data=f"category:{category.pk}",
-                )
-            )
         await message.answer(
             text=__(UserPostCardHandler.Texts.SELECT_CATEGORY.value),
-            reply_markup=inline_markup,
+            reply_markup=catalog.get_catalog().get_keyboard("categories"),
+        )
+
+    @Handler.message_handler(
+        Text(equals=__(MainMenuHandler.Buttons.MY_POSTCARDS.value))
+    )
+    async def history_handler(message: types.Message):
+        """Show the postcards the user sent."""
+
+        text, markup = await UserPostCardHandler.get_history_page(
+            message.from_user.id
+        )
+        await message.answer(text, reply_markup=markup)
+
+    @Handler.callback_query_handler(Text(startswith="history:"))
+    async def history_page_handler(call: CallbackQuery):
+        """Show another page of sent postcards."""
+
+        before = None
+        if call.data != "history:newest":
+            created, entry_id = call.data.split(":")[1:]
+            before = (
+                HISTORY_EPOCH + timedelta(milliseconds=int(created)),
+                ObjectId(entry_id),
+            )
+        text, markup = await UserPostCardHandler.get_history_page(
+            call.from_user.id, before
         )
+        await call.answer()
+        await call.message.edit_text(text, reply_markup=markup)
+
+    @Handler.callback_query_handler(Text(startswith="resend:"))
+    async def resend_handler(call: CallbackQuery):
+        """Send a postcard from the history again, without rendering it."""
+
+        entry = await HistoryEntry(_id=ObjectId(call.data.split(":")[1])).get()
+        await call.answer()
+        if entry is None or entry.user_id != call.from_user.id:
+            await call.message.answer(
+                UserPostCardHandler.Buttons.POSTCARDS_NOT_FOUND.value
+            )
+            return
+
+        await call.message.answer_photo(
+            photo=entry.file_id, caption=entry.to_user
+        )
+
+    @Handler.message_handler(commands=["search"])
+    async def search_command_handler(
+        message: types.Message, state: FSMContext
+    ):
+        """Search postcards, with the query after the command."""
+
+        query = message.get_args()
+        if query:
+            await UserPostCardHandler.show_search_results(
+                message, state, query
+            )
+            return
+
+        await SearchPostCard.query.set()
+        await message.answer(
+            UserPostCardHandler.Texts.ENTER_SEARCH_QUERY.value
+        )
+
+    @Handler.callback_query_handler(Text(equals="search"))
+    async def search_handler(call: CallbackQuery):
+        """Ask for a search query."""
+
+        await call.answer()
+        await SearchPostCard.query.set()
+        await call.message.answer(
+            UserPostCardHandler.Texts.ENTER_SEARCH_QUERY.value
+        )
+
+    @Handler.message_handler(
+        content_types=types.ContentType.TEXT, state=SearchPostCard.query
+    )
+    async def process_search_query(message: types.Message, state: FSMContext):
+        """Process search query."""
+
+        await UserPostCardHandler.show_search_results(
+            message, state, message.text
+        )
+
+    @Handler.callback_query_handler(Text(startswith="search_page:"))
+    async def search_page_handler(call: CallbackQuery, state: FSMContext):
+        """Show another page of search results."""
+
+        await call.answer()
+        query = (await state.get_data()).get("search_query")
+        if not query:
+            return
+
+        text, markup = await UserPostCardHandler.get_search_page(
+            query, int(call.data.split(":")[1])
+        )
+        await call.message.edit_text(text, reply_markup=markup)
 
     @Handler.callback_query_handler(Text(startswith="category:"))
     async def category_handler(call: CallbackQuery, state: FSMContext):
         """Category handler."""
 
-        category_id = ObjectId(call.data.split(":")[1])
-        category = await Category(_id=category_id).get()
+        category_id = catalog.parse_key(call.data.split(":")[1])
+        current_catalog = catalog.get_catalog()
+        category = current_catalog.category_index.get(category_id)
 
-        if category and category.is_active:
-            postcards = await PostCard.filter(
-                category_id=category_id, is_active=True
-            )
+        if category or category_id == catalog.POPULAR:
             bot = Bot.get_current()
-            await bot.send_message(
-                chat_id=call.from_user.id,
-                text=__(
-                    UserPostCardHandler.Texts.SELECT_POSTCARD_TEMPLATE.value
-                ),
-            )
-            if postcards:
-                for postcard in postcards:
-                    await bot.send_photo(
-                        chat_id=call.from_user.id,
-                        photo=postcard.thumbnail,
-                        caption=postcard.name + "\n\n" + postcard.description,
-                        reply_markup=types.InlineKeyboardMarkup().add(
-                            types.InlineKeyboardButton(
-                                UserPostCardHandler.Buttons.SEND.value,
-                                callback_data=f"send_postcard:{postcard.pk}",
-                            )
-                        ),
-                    )
+            if (
+                category
+                and category.contact_sheet
+                and category.contact_sheet_postcards
+            ):
+                await bot.send_photo(
+                    chat_id=call.from_user.id,
+                    photo=category.contact_sheet,
+                    caption=UserPostCardHandler.Texts.SELECT_POSTCARD_TEMPLATE.value,  # noqa: E501
+                    reply_markup=current_catalog.get_keyboard(category_id),
+                )
+                return
+
+            page = current_catalog.get_page(category_id, 0)
+            if page:
+                postcard, caption, markup = page
+                await bot.send_photo(
+                    chat_id=call.from_user.id,
+                    photo=postcard.get_rendition(config.RENDITION_BROWSE_SIZE),
+                    caption=caption,
+                    reply_markup=markup,
+                )
             else:
                 await bot.send_message(
                     chat_id=call.from_user.id,
@@ -151,6 +452,31 @@ async def category_handler(call: CallbackQuery, state: FSMContext):
                 UserPostCardHandler.Buttons.CATEGORY_NOT_FOUND.value
             )
 
+    @Handler.callback_query_handler(Text(startswith="carousel:"))
+    async def carousel_handler(call: CallbackQuery):
+        """Show another postcard in the category carousel."""
+
+        category_id, index = call.data.split(":")[1:]
+        page = catalog.get_catalog().get_page(
+            catalog.parse_key(category_id), int(index)
+        )
+        await call.answer()
+        if not page:
+            await call.message.edit_caption(
+                UserPostCardHandler.Buttons.POSTCARDS_NOT_FOUND.value,
+                reply_markup=None,
+            )
+            return
+
+        postcard, caption, markup = page
+        await call.message.edit_media(
+            types.InputMediaPhoto(
+                media=postcard.get_rendition(config.RENDITION_BROWSE_SIZE),
+                caption=caption,
+            ),
+            reply_markup=markup,
+        )
+
     @Handler.callback_query_handler(Text(startswith="send_postcard:"))
     async def send_postcard_image_handler(
         call: CallbackQuery, state: FSMContext
@@ -158,8 +484,8 @@ async def send_postcard_image_handler(
         """Send postcard handler."""
 
         postcard_id = ObjectId(call.data.split(":")[1])
-        postcard = await PostCard(_id=postcard_id).get()
-        if postcard and postcard.is_active:
+        postcard = catalog.get_catalog().postcard_index.get(postcard_id)
+        if postcard:
             dp = Dispatcher.get_current()
             state = dp.current_state()
             async with state.proxy() as data:
@@ -188,9 +514,7 @@ async def process_from_user(message: types.Message, state: FSMContext):
             data["from_user"] = message.text
 
         await SendPostCard.next()
-        await message.answer(
-            UserPostCardHandler.Texts.ENTER_RECEIVER_NAME.value
-        )
+        await UserPostCardHandler.ask_receiver_name(message)
 
     @Handler.message_handler(
         content_types=types.ContentType.TEXT, state=SendPostCard.to_user
@@ -198,31 +522,111 @@ async def process_from_user(message: types.Message, state: FSMContext):
     async def process_to_user(message: types.Message, state: FSMContext):
         """Process to user."""
 
+        to_users = [
+            name.strip() for name in message.text.splitlines() if name.strip()
+        ]
+        if not to_users:
+            await message.answer(
+                UserPostCardHandler.Texts.EMPTY_RECEIVER_NAME.value
+            )
+            return
+        if len(to_users) > config.BATCH_MAX_RECIPIENTS:
+            await message.answer(
+                UserPostCardHandler.Texts.TOO_MANY_RECEIVERS.value.format(
+                    count=config.BATCH_MAX_RECIPIENTS
+                )
+            )
+            return
+        if len(to_users) > 1:
+            await UserPostCardHandler.process_to_users(
+                message, state, to_users
+            )
+            return
+
         async with state.proxy() as data:
-            data["to_user"] = message.text
+            new_postcards = await UserPostCardHandler.schedule_render(
+                message,
+                RenderScheduler.PREVIEW,
+                lambda: render_postcards(
+                    data["postcard"],
+                    data["from_user"],
+                    to_users,
+                    RenderScheduler.PREVIEW,
+                ),
+                data["postcard"],
+            )
+            if new_postcards is None:
+                return
 
+            data["to_user"] = to_users[0]
             await SendPostCard.next()
-            await message.answer_chat_action("upload_photo")
-
-            new_postcard = await create_postcard(
-                data["postcard"].image, data["from_user"], data["to_user"]
-            )
 
             prepared_message = await message.answer_photo(
-                photo=new_postcard,
+                photo=new_postcards[0],
                 caption=UserPostCardHandler.Texts.CONFIRM_SEND_POSTCARD.value,
-                reply_markup=types.InlineKeyboardMarkup().add(
-                    types.InlineKeyboardButton(
-                        UserPostCardHandler.Buttons.CONFRIM.value,
-                        callback_data="confirm_send_postcard",
-                    ),
-                    types.InlineKeyboardButton(
-                        UserPostCardHandler.Buttons.CANCEL.value,
-                        callback_data="cancel_send_postcard",
-                    ),
+                reply_markup=UserPostCardHandler.get_confirm_options(),
+            )
+            data["message_id"] = prepared_message.message_id
+            data["file_ids"] = [prepared_message.photo[-1].file_id]
+
+    @staticmethod
+    async def process_to_users(message, state, to_users):
+        """Render one postcard per receiver and send them as albums."""
+
+        async with state.proxy() as data:
+            new_postcards = await UserPostCardHandler.schedule_render(
+                message,
+                RenderScheduler.BATCH,
+                lambda: render_postcards(
+                    data["postcard"],
+                    data["from_user"],
+                    to_users,
+                    RenderScheduler.BATCH,
+                ),
+                data["postcard"],
+            )
+            if new_postcards is None:
+                return
+
+            data["to_user"] = to_users
+            await SendPostCard.next()
+
+            sent_messages = []
+            renders = list(zip(to_users, new_postcards))
+            # Telegram albums hold 2 to 10 photos.
+            for start in range(0, len(renders), 10):
+                chunk = renders[start : start + 10]  # noqa: E203
+                if len(chunk) == 1:
+                    to_user, new_postcard = chunk[0]
+                    sent_messages.append(
+                        await message.answer_photo(
+                            photo=new_postcard, caption=to_user
+                        )
+                    )
+                    continue
+
+                media = types.MediaGroup()
+                for to_user, new_postcard in chunk:
+                    media.attach_photo(
+                        types.InputFile(new_postcard, filename="postcard.png"),
+                        caption=to_user,
+                    )
+                sent_messages.extend(await message.answer_media_group(media))
+
+            prepared_message = await message.answer(
+                UserPostCardHandler.Texts.CONFIRM_SEND_POSTCARDS.value.format(
+                    count=len(to_users)
                 ),
+                reply_markup=UserPostCardHandler.get_confirm_options(),
             )
             data["message_id"] = prepared_message.message_id
+            data["message_ids"] = [
+                sent_message.message_id for sent_message in sent_messages
+            ]
+            data["file_ids"] = [
+                sent_message.photo[-1].file_id
+                for sent_message in sent_messages
+            ]
 
     @Handler.callback_query_handler(
         Text(startswith="confirm_send_postcard"),
@@ -238,15 +642,41 @@ async def confirm_send_postcard_handler(
                 f"Postcard sent from {data['from_user']} to {data['to_user']}"
                 f"Using  {data['postcard'].name}({data['postcard'].pk})"
             )
+            to_users = data["to_user"]
+            if not isinstance(to_users, list):
+                to_users = [to_users]
+            counters.record_send(data["postcard"], len(to_users))
+            rollup.record_send(data["postcard"], len(to_users))
+            events.record(
+                SendEvent.CONFIRM,
+                data["postcard"],
+                call.from_user.id,
+                quantity=len(to_users),
+            )
+            entries = [
+                HistoryEntry(
+                    user_id=call.from_user.id,
+                    postcard_id=data["postcard"].pk,
+                    from_user=data["from_user"],
+                    to_user=to_user,
+                    file_id=file_id,
+                )
+                for to_user, file_id in zip(to_users, data.get("file_ids", []))
+            ]
 
         await call.answer()
+        if entries:
+            await HistoryEntry.bulk_create(entries)
 
         await state.finish()
 
-        await call.message.edit_caption(
-            caption=UserPostCardHandler.Texts.POSTCARD_CAPTION.value,
-            reply_markup=None,
-        )
+        if data.get("message_ids"):
+            await call.message.delete()
+        else:
+            await call.message.edit_caption(
+                caption=UserPostCardHandler.Texts.POSTCARD_CAPTION.value,
+                reply_markup=None,
+            )
         await Bot.get_current().send_message(
             chat_id=call.from_user.id,
             text=UserPostCardHandler.Texts.POSTCARD_READY.value,
@@ -262,8 +692,21 @@ async def cancel_send_postcard_handler(
     ):
         """Cancel send postcard handler."""
 
+        async with state.proxy() as data:
+            message_ids = data.get("message_ids", [])
+            events.record(
+                SendEvent.CANCEL,
+                data["postcard"],
+                call.from_user.id,
+                quantity=len(data.get("file_ids", [])),
+            )
+
+        bot = Bot.get_current()
+        for message_id in message_ids:
+            await bot.delete_message(call.message.chat.id, message_id)
         await call.message.delete()
         await state.finish()
+        rollup.record("cancels")
 
         await Bot.get_current().send_message(
             chat_id=call.from_user.id,
@@ -0,0 +1,350 @@
+"""PostCardBot bulk template importer.
+
+Imports postcard templates from a directory or a zip archive with a
+manifest, for example:
+
+    python -m PostCardBot.importer seasonal-pack.zip
+
+The manifest is a `manifest.csv` with `category`, `name`, `description` and
+`file` columns, or a `manifest.json` list of objects with the same keys.
+Progress is journaled next to the source, so an interrupted import can be
+started again and continues where it stopped. Entries that failed are
+skipped when the import is started again, unless `--retry-failed` is given.
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from aiogram import Bot
+
+from loguru import logger
+
+from PostCardBot.core import config
+from PostCardBot.core.assets import prepare_image, upload_renditions
+from PostCardBot.core.storage import TemplateStore
+from PostCardBot.models import Category, PostCard
+
+MANIFEST_FIELDS = ("category", "name", "description", "file")
+
+
+class Source:
+    """Files of a directory or a zip archive."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.is_archive = zipfile.is_zipfile(self.path)
+
+    def read(self, name):
+        """Read a file of the source."""
+
+        if self.is_archive:
+            with zipfile.ZipFile(self.path) as archive:
+                return archive.read(name)
+        return (self.path / name).read_bytes()
+
+    def exists(self, name):
+        """Check whether the source has a file."""
+
+        if self.is_archive:
+            with zipfile.ZipFile(self.path) as archive:
+                return name in archive.namelist()
+        return (self.path / name).is_file()
+
+    def manifest(self):
+        """Read the manifest entries."""
+
+        if self.exists("manifest.json"):
+            entries = json.loads(self.read("manifest.json"))
+        elif self.exists("manifest.csv"):
+            text = self.read("manifest.csv").decode("utf-8-sig")
+            entries = list(csv.DictReader(io.StringIO(text)))
+        else:
+            raise SystemExit(f"No manifest in {self.path}")
+
+        for number, entry in enumerate(entries, start=1):
+            missing = [
+                field for field in MANIFEST_FIELDS if not entry.get(field)
+            ]
+            if missing:
+                raise SystemExit(
+                    f"Manifest entry {number} is missing {', '.join(missing)}"
+                )
+        return entries
+
+
+class Journal:
+    """Import progress, saved next to the source."""
+
+    def __init__(self, source_path):
+        source_path = Path(source_path).resolve()
+        self.path = source_path.with_name(source_path.name + ".import.json")
+        self.entries = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+
+    def get(self, key):
+        return self.entries.get(key, {})
+
+    def set(self, key, **values):
+        self.entries.setdefault(key, {}).update(values)
+
+    def save(self):
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.entries))
+        os.replace(temp_path, self.path)
+
+
+class RateLimiter:
+    """Spread calls evenly to stay under a rate per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_call = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_call > now:
+                await asyncio.sleep(self.next_call - now)
+            self.next_call = max(now, self.next_call) + self.interval
+
+
+def process_entry(source_path, file_name):
+    """
+    Decode and normalize a template in a worker process.
+
+    The render master is written to the template store here, only the
+    fingerprints and encoded renditions are sent back.
+    """
+
+    master, encoded, phash = prepare_image(Source(source_path).read(file_name))
+    content_hash = TemplateStore().write(master)
+    return (
+        content_hash,
+        phash,
+        {name: rendition.getvalue() for name, rendition in encoded.items()},
+    )
+
+
+def entry_key(entry):
+    """Get the journal key of a manifest entry."""
+
+    return f"{entry['category']}/{entry['file']}"
+
+
+async def get_categories(names):
+    """Get categories by name, creating the missing ones."""
+
+    categories = {
+        category.name: category
+        for category in await Category.filter(name={"$in": list(names)})
+    }
+    missing = [
+        Category(name=name, description=name)
+        for name in names
+        if name not in categories
+    ]
+    if missing:
+        await Category.bulk_create(missing)
+        logger.info(f"Created {len(missing)} categories.")
+    return {
+        **categories,
+        **{category.name: category for category in missing},
+    }
+
+
+async def upload_entry(entry, result, limiter, journal):
+    """Upload the renditions of a processed entry."""
+
+    content_hash, phash, encoded = result
+    await TemplateStore().upload(content_hash)
+
+    renditions = {}
+    for name, data in encoded.items():
+        await limiter.wait()
+        renditions.update(await upload_renditions({name: io.BytesIO(data)}))
+
+    journal.set(
+        entry_key(entry),
+        content_hash=content_hash,
+        phash=phash,
+        renditions=renditions,
+    )
+    journal.save()
+    return entry
+
+
+async def insert_postcards(entries, categories, journal):
+    """Insert uploaded entries as postcards with one bulk write."""
+
+    postcards = []
+    for entry in entries:
+        progress = journal.get(entry_key(entry))
+        postcards.append(
+            PostCard(
+                name=entry["name"],
+                description=entry["description"],
+                category_id=categories[entry["category"]].pk,
+                image=progress["renditions"]["master"]["file_id"],
+                content_hash=progress["content_hash"],
+                phash=progress.get("phash"),
+                renditions=progress["renditions"],
+            )
+        )
+    if postcards:
+        await PostCard.bulk_create(postcards)
+    for entry in entries:
+        journal.set(entry_key(entry), inserted=True)
+    journal.save()
+    logger.info(f"Inserted {len(postcards)} postcards.")
+
+
+async def run(path, workers, retry_failed=False):
+    """Import the templates of a source."""
+
+    if not config.STORAGE_CHAT_ID:
+        raise SystemExit("STORAGE_CHAT_ID must be set to import templates.")
+
+    source = Source(path)
+    entries = source.manifest()
+    journal = Journal(path)
+    categories = await get_categories({entry["category"] for entry in entries})
+
+    # Templates that are already in the catalog are not imported twice.
+    # Entries without a journaled hash are not compared, as postcards that
+    # are still processing have no hash either.
+    hashes = [
+        journal.get(entry_key(entry)).get("content_hash") for entry in entries
+    ]
+    hashes = [content_hash for content_hash in hashes if content_hash]
+    existing = set()
+    if hashes:
+        existing = {
+            postcard.content_hash
+            for postcard in await PostCard.filter(content_hash={"$in": hashes})
+        }
+    pending = []
+    for entry in entries:
+        progress = journal.get(entry_key(entry))
+        if progress.get("inserted"):
+            continue
+        if progress.get("failed") and not retry_failed:
+            continue
+        if progress.get("content_hash") in existing:
+            journal.set(entry_key(entry), inserted=True)
+            continue
+        pending.append(entry)
+    logger.info(
+        f"Importing {len(pending)} of {len(entries)} templates from {path}."
+    )
+
+    loop = asyncio.get_running_loop()
+    limiter = RateLimiter(config.IMPORT_UPLOAD_RATE)
+    semaphore = asyncio.Semaphore(config.IMPORT_UPLOAD_CONCURRENCY)
+    insert_lock = asyncio.Lock()
+    # The queue is bounded, so only the entries being processed or uploaded
+    # hold their encoded renditions in memory.
+    queue = asyncio.Queue(maxsize=workers)
+    uploaded = []
+    failed = []
+
+    async def feed_entries():
+        for entry in pending:
+            await queue.put(entry)
+        for _importer in range(importers):
+            await queue.put(None)
+
+    async def import_entries(pool):
+        nonlocal uploaded
+
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            key = entry_key(entry)
+            try:
+                if "renditions" not in journal.get(key):
+                    result = await loop.run_in_executor(
+                        pool, process_entry, str(source.path), entry["file"]
+                    )
+                    async with semaphore:
+                        await upload_entry(entry, result, limiter, journal)
+            except Exception as error:
+                # One bad file must not stop the rest of the pack.
+                logger.exception(f"Failed to import {key}.")
+                journal.set(key, failed=repr(error))
+                journal.save()
+                failed.append(key)
+                continue
+            journal.get(key).pop("failed", None)
+            async with insert_lock:
+                uploaded.append(entry)
+                if len(uploaded) >= config.IMPORT_BATCH_SIZE:
+                    batch, uploaded = uploaded, []
+                    await insert_postcards(batch, categories, journal)
+
+    importers = workers + config.IMPORT_UPLOAD_CONCURRENCY
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = [asyncio.create_task(feed_entries())] + [
+            asyncio.create_task(import_entries(pool))
+            for _importer in range(importers)
+        ]
+        try:
+            await asyncio.gather(*running)
+        finally:
+            for task in running:
+                task.cancel()
+        await insert_postcards(uploaded, categories, journal)
+
+    # The bot rebuilds contact sheets without a file id when it starts.
+    await Category.update(
+        {"_id": {"$in": [category.pk for category in categories.values()]}},
+        contact_sheet=None,
+    )
+    logger.info(
+        f"Imported {len(pending) - len(failed)} templates from {path}."
+    )
+    if failed:
+        logger.warning(
+            f"Failed to import {len(failed)} templates, they are skipped "
+            f"until the import is run with --retry-failed: {', '.join(failed)}"
+        )
+
+
+async def main():
+    """Run the importer."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="directory or zip archive to import")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of image processing processes",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="import entries that failed before again",
+    )
+    args = parser.parse_args()
+
+    bot = Bot(token=config.API_TOKEN)
+    Bot.set_current(bot)
+    try:
+        await run(args.path, args.workers, args.retry_failed)
+    finally:
+        await (await bot.get_session()).close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
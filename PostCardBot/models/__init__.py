@@ -1,3 +1,13 @@
+from .events import SendEvent
+from .history import HistoryEntry
 from .postcard import Category, PostCard
+from .stats import ActivitySketch, DailyStats
 
-__all__ = ["Category", "PostCard"]
+__all__ = [
+    "ActivitySketch",
+    "Category",
+    "DailyStats",
+    "HistoryEntry",
+    "PostCard",
+    "SendEvent",
+]
@@ -0,0 +1,40 @@
+"""PostCardBot send event model."""
+
+from pymongo import IndexModel
+
+from PostCardBot.core.model import DatabaseModel
+
+
+class SendEvent(DatabaseModel):
+    """
+    A step of sending a postcard.
+
+    ``meta`` holds the ``action``, one of ``preview``, ``confirm`` or
+    ``cancel``, with the ``postcard_id`` and ``category_id``. ``quantity``
+    is the number of postcards of the step. Events are only ever inserted,
+    into a time-series collection bucketed by ``meta``.
+    """
+
+    PREVIEW = "preview"
+    CONFIRM = "confirm"
+    CANCEL = "cancel"
+
+    quantity = 1
+
+    class Meta(DatabaseModel.Meta):
+        collection_name = "send_event"
+        model_name = "send_event"
+        fields = [
+            "meta",
+            "user_id",
+            "locale",
+            "render_time",
+            "quantity",
+            "created",
+        ]
+        indexes = [IndexModel([("meta.action", 1), ("created", 1)])]
+        timeseries = {
+            "timeField": "created",
+            "metaField": "meta",
+            "granularity": "hours",
+        }
@@ -0,0 +1,24 @@
+"""PostCardBot postcard history model."""
+
+from pymongo import IndexModel
+
+from PostCardBot.core.model import DatabaseModel
+
+
+class HistoryEntry(DatabaseModel):
+    """A postcard a user sent."""
+
+    class Meta(DatabaseModel.Meta):
+        collection_name = "history"
+        model_name = "history"
+        fields = [
+            "user_id",
+            "postcard_id",
+            "from_user",
+            "to_user",
+            "file_id",
+            "created",
+        ]
+        indexes = [
+            IndexModel([("user_id", 1), ("created", -1), ("_id", -1)]),
+        ]
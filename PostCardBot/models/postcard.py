@@ -1,7 +1,37 @@
 """PostCardBot postcard model."""
 
+from PIL import ImageColor
+from pymongo import TEXT, IndexModel
+
+from PostCardBot.core import config
+from PostCardBot.core.images import hash_distances
 from PostCardBot.core.model import DatabaseModel
 
+# Text boxes are given as fractions of the template width and height, so one
+# layout works for every size of the same template.
+
+DEFAULT_TEXT_BOX = {
+    "font": config.DEFAULT_FONT,
+    "size": 96,
+    "min_size": 24,
+    "color": "#ffffff",
+    "align": "left",
+    "fit": "shrink",
+}
+
+DEFAULT_LAYOUT = {
+    "from_user": {"box": [0.05, 0.05, 0.95, 0.15]},
+    "to_user": {"box": [0.05, 0.15, 0.95, 0.25]},
+}
+
+TEXT_ALIGNMENTS = ("left", "center", "right")
+
+TEXT_FIT_RULES = ("shrink", "none")
+
+# Thumbnails made before renditions existed were capped to this size.
+
+LEGACY_THUMBNAIL_SIZE = 300
+
 
 class Category(DatabaseModel):
     """PostCardBot postcard category model."""
@@ -11,7 +41,13 @@ class Category(DatabaseModel):
     class Meta(DatabaseModel.Meta):
         collection_name = "category"
         model_name = "category"
-        fields = ["name", "description", "is_active"]
+        fields = [
+            "name",
+            "description",
+            "is_active",
+            "contact_sheet",
+            "contact_sheet_postcards",
+        ]
 
 
 class PostCard(DatabaseModel):
@@ -29,4 +65,147 @@ class Meta(DatabaseModel.Meta):
             "category_id",
             "image",
             "thumbnail",
+            "content_hash",
+            "phash",
+            "layout",
+            "renditions",
         ]
+        indexes = [
+            IndexModel("content_hash"),
+            IndexModel("phash"),
+            IndexModel([("category_id", 1), ("is_active", 1), ("_id", 1)]),
+            IndexModel(
+                [("name", TEXT), ("description", TEXT)],
+                default_language="none",
+            ),
+        ]
+
+    @property
+    def template_key(self):
+        """Get the key used by template caches."""
+
+        return self.content_hash or str(self.pk)
+
+    async def find_duplicates(self):
+        """
+        Get other postcards with the same image and with a similar image.
+
+        Similar images are the ones whose perceptual hashes differ in at
+        most ``DUPLICATE_DISTANCE`` bits. Only the hashes of the other
+        postcards are fetched to compare them.
+        """
+
+        exact = []
+        if self.content_hash:
+            exact = await PostCard.filter(
+                _id={"$ne": self.pk}, content_hash=self.content_hash
+            )
+        if not self.phash:
+            return exact, []
+
+        candidates = [
+            document
+            async for document in PostCard.stream(
+                projection=["phash"],
+                _id={"$nin": [self.pk, *(postcard.pk for postcard in exact)]},
+                phash={"$ne": None},
+            )
+        ]
+        distances = hash_distances(
+            [document["phash"] for document in candidates], self.phash
+        )
+        similar = [
+            document["_id"]
+            for document, distance in zip(candidates, distances)
+            if distance <= config.DUPLICATE_DISTANCE
+        ]
+        if not similar:
+            return exact, []
+        return exact, await PostCard.filter(_id={"$in": similar})
+
+    def get_rendition(self, size):
+        """
+        Get the file id of the smallest image covering ``size`` pixels.
+
+        Falls back to the largest rendition, or to the legacy thumbnail and
+        the original image while renditions are not generated yet.
+        """
+
+        renditions = sorted(
+            (self.renditions or {}).values(),
+            key=lambda rendition: max(rendition["width"], rendition["height"]),
+        )
+        for rendition in renditions:
+            if max(rendition["width"], rendition["height"]) >= size:
+                return rendition["file_id"]
+        if renditions:
+            return renditions[-1]["file_id"]
+        if self.thumbnail and size <= LEGACY_THUMBNAIL_SIZE:
+            return self.thumbnail
+        return self.image
+
+    def get_layout(self):
+        """Get the text boxes of the postcard merged with the defaults."""
+
+        layout = self.layout or {}
+        return {
+            name: {**DEFAULT_TEXT_BOX, **box, **layout.get(name, {})}
+            for name, box in DEFAULT_LAYOUT.items()
+        }
+
+    @staticmethod
+    def validate_layout(layout):
+        """
+        Validate layout metadata.
+
+        Raises ``ValueError`` when the layout can not be used for rendering.
+        """
+
+        if not isinstance(layout, dict):
+            raise ValueError("Layout must be an object.")
+
+        for name, box in layout.items():
+            if name not in DEFAULT_LAYOUT:
+                raise ValueError(f"Unknown text box: {name}.")
+            if not isinstance(box, dict):
+                raise ValueError(f"Text box {name} must be an object.")
+
+            unknown = set(box) - set(DEFAULT_TEXT_BOX) - {"box"}
+            if unknown:
+                raise ValueError(f"Unknown options: {', '.join(unknown)}.")
+
+            if "box" in box:
+                bounds = box["box"]
+                if (
+                    not isinstance(bounds, list)
+                    or len(bounds) != 4
+                    or not all(
+                        isinstance(value, (int, float)) and 0 <= value <= 1
+                        for value in bounds
+                    )
+                    or bounds[0] >= bounds[2]
+                    or bounds[1] >= bounds[3]
+                ):
+                    raise ValueError(
+                        f"Box of {name} must be [left, top, right, bottom]"
+                        " fractions between 0 and 1."
+                    )
+            for option in ("size", "min_size"):
+                if option in box and not (
+                    isinstance(box[option], int) and box[option] > 0
+                ):
+                    raise ValueError(f"{option} must be a positive integer.")
+            if "color" in box:
+                try:
+                    ImageColor.getrgb(box["color"])
+                except (AttributeError, ValueError):
+                    raise ValueError(f"Unknown color: {box['color']}.")
+            if box.get("align", "left") not in TEXT_ALIGNMENTS:
+                raise ValueError(
+                    f"align must be one of {', '.join(TEXT_ALIGNMENTS)}."
+                )
+            if box.get("fit", "shrink") not in TEXT_FIT_RULES:
+                raise ValueError(
+                    f"fit must be one of {', '.join(TEXT_FIT_RULES)}."
+                )
+        return layout
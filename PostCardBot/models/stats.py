@@ -0,0 +1,47 @@
+"""PostCardBot daily stats model."""
+
+from pymongo import IndexModel
+
+from PostCardBot.core.model import DatabaseModel
+
+
+class DailyStats(DatabaseModel):
+    """
+    Counters of one day, keyed by the ``YYYY-MM-DD`` date.
+
+    ``postcards`` and ``categories`` map ids to their sends on the day.
+    """
+
+    new_users = 0
+    sends = 0
+    renders = 0
+    cancels = 0
+    postcards = dict
+    categories = dict
+
+    class Meta(DatabaseModel.Meta):
+        collection_name = "daily_stats"
+        model_name = "daily_stats"
+        fields = [
+            "new_users",
+            "sends",
+            "renders",
+            "cancels",
+            "postcards",
+            "categories",
+        ]
+
+
+class ActivitySketch(DatabaseModel):
+    """
+    HyperLogLog registers of the users active on a day in one process.
+
+    Keyed by ``<day>:<worker>``, so each process only writes its own
+    sketch.
+    """
+
+    class Meta(DatabaseModel.Meta):
+        collection_name = "activity_sketch"
+        model_name = "activity_sketch"
+        fields = ["day", "worker", "registers"]
+        indexes = [IndexModel("day")]
@@ -0,0 +1,91 @@
+"""PostCardBot render worker.
+
+Claims render jobs from the MongoDB job queue, so rendering can run on
+other hosts than the bot. Start it with `python -m PostCardBot.render_worker`
+and set `RENDER_BACKEND=mongo` for the bot.
+"""
+
+import asyncio
+import os
+import socket
+
+from aiogram import Bot
+
+from loguru import logger
+
+from PostCardBot.core import config
+from PostCardBot.core.helpers import create_postcards
+from PostCardBot.core.jobs import render_queue
+from PostCardBot.models import PostCard
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def process(queue, job):
+    """Render the postcards of a job."""
+
+    payload = job["payload"]
+    renders = await create_postcards(
+        PostCard.from_dict(payload["postcard"]),
+        payload["from_user"],
+        payload["to_users"],
+    )
+    file_ids = await queue.store_renders(renders)
+    if not await queue.complete(job, file_ids):
+        logger.warning(f"Lost the lease of render job {job['_id']}.")
+        await queue.delete_renders(file_ids)
+
+
+async def work(queue):
+    """
+    Claim and process jobs forever.
+
+    Database errors are logged and retried with a growing delay, so the
+    worker outlives a database outage.
+    """
+
+    delay = config.JOB_POLL_INTERVAL
+    while True:
+        try:
+            job = await queue.claim(WORKER_ID)
+            if job is None:
+                await queue.expire()
+        except Exception:
+            logger.exception("Failed to claim a render job.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.JOB_RETRY_DELAY)
+            continue
+
+        delay = config.JOB_POLL_INTERVAL
+        if job is None:
+            await asyncio.sleep(config.JOB_POLL_INTERVAL)
+            continue
+
+        logger.info(f"Rendering job {job['_id']} (attempt {job['attempts']}).")
+        try:
+            await process(queue, job)
+        except Exception as error:
+            logger.exception(f"Render job {job['_id']} failed.")
+            try:
+                await queue.fail(job, error)
+            except Exception:
+                # The lease runs out and the job is claimed again.
+                logger.exception(f"Failed to release render job {job['_id']}.")
+
+
+async def main():
+    """Run the render worker."""
+
+    # Templates without a render master are downloaded from Telegram.
+    Bot.set_current(Bot(token=config.API_TOKEN))
+
+    await render_queue.create_indexes()
+
+    logger.info(f"Render worker {WORKER_ID} started.")
+    await asyncio.gather(
+        *(work(render_queue) for _ in range(config.RENDER_CONCURRENCY))
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""Tests for the PostCardBot HyperLogLog sketches."""
+
+import pytest
+
+from PostCardBot.core.hll import ERROR, HyperLogLog
+
+
+def sketch(values):
+    hll = HyperLogLog()
+    for value in values:
+        hll.add(value)
+    return hll
+
+
+@pytest.mark.parametrize("count", [100, 10_000, 100_000])
+def test_estimate_error(count):
+    estimate = sketch(range(count)).count()
+
+    assert abs(estimate - count) <= 3 * ERROR * count
+
+
+def test_add_reports_changes():
+    hll = HyperLogLog()
+
+    assert hll.add(42)
+    assert not hll.add(42)
+    assert hll.count() == 1
+
+
+def test_merge():
+    first = sketch(range(0, 6000))
+    second = sketch(range(4000, 10_000))
+    union = sketch(range(10_000))
+
+    merged = HyperLogLog(first.registers).merge(second)
+    assert merged.registers == union.registers
+    assert abs(merged.count() - 10_000) <= 3 * ERROR * 10_000
+
+    # Merging is idempotent and does not change the other sketch.
+    assert merged.merge(second).registers == union.registers
+    assert second.registers == sketch(range(4000, 10_000)).registers
@@ -0,0 +1,133 @@
+"""Tests for the MongoDB job queue, run against a local mongod."""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+from PostCardBot.core import config
+from PostCardBot.core.jobs import JobFailed, JobQueue
+
+MONGODB_URL = os.environ.get("MONGODB_TEST_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="module")
+def mongod():
+    client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except ServerSelectionTimeoutError:
+        pytest.skip(f"No mongod at {MONGODB_URL}")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def collection_name(mongod, monkeypatch):
+    monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 60)
+    monkeypatch.setattr(config, "JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(config, "JOB_RETRY_DELAY", 0)
+    name = f"test_job_{uuid.uuid4().hex}"
+    yield name
+    mongod.postcardbot_test.drop_collection(name)
+
+
+def run_queue(collection_name, test):
+    """Run a test coroutine with a queue on its own test collection."""
+
+    async def run():
+        client = AsyncIOMotorClient(MONGODB_URL)
+        queue = JobQueue.__new__(JobQueue)
+        queue.collection = client.postcardbot_test[collection_name]
+        try:
+            await queue.create_indexes()
+            await test(queue)
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_claim_by_priority_and_complete(collection_name):
+    async def test(queue):
+        batch = await queue.enqueue("render", {"n": 1}, priority=1)
+        preview = await queue.enqueue("render", {"n": 2}, priority=0)
+
+        job = await queue.claim("worker-a")
+        assert job["_id"] == preview
+        assert job["attempts"] == 1
+        assert await queue.complete(job, ["file"])
+        assert await queue.wait(preview, timeout=1) == ["file"]
+
+        assert (await queue.claim("worker-a"))["_id"] == batch
+        assert await queue.claim("worker-a") is None
+
+    run_queue(collection_name, test)
+
+
+def test_expired_lease_is_claimed_again(collection_name, monkeypatch):
+    async def test(queue):
+        job_id = await queue.enqueue("render", {})
+        monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 0)
+        first = await queue.claim("worker-a")
+        await asyncio.sleep(0.01)
+
+        second = await queue.claim("worker-b")
+        assert second["_id"] == job_id
+        assert second["lease"] != first["lease"]
+
+        # Only the current lease holder can finish the job.
+        assert not await queue.complete(first, ["stale"])
+        assert await queue.complete(second, ["fresh"])
+        assert await queue.wait(job_id, timeout=1) == ["fresh"]
+
+    run_queue(collection_name, test)
+
+
+def test_failed_job_is_retried_until_out_of_attempts(collection_name):
+    async def test(queue):
+        job_id = await queue.enqueue("render", {})
+
+        await queue.fail(await queue.claim("worker-a"), ValueError("once"))
+        job = await queue.claim("worker-a")
+        assert job["attempts"] == 2
+        await queue.fail(job, ValueError("twice"))
+
+        assert await queue.claim("worker-a") is None
+        with pytest.raises(JobFailed, match="twice"):
+            await queue.wait(job_id, timeout=1)
+
+    run_queue(collection_name, test)
+
+
+def test_expire_fails_last_attempt(collection_name, monkeypatch):
+    async def test(queue):
+        monkeypatch.setattr(config, "JOB_MAX_ATTEMPTS", 1)
+        monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 0)
+        job_id = await queue.enqueue("render", {})
+        await queue.claim("worker-a")
+        await asyncio.sleep(0.01)
+
+        await queue.expire()
+        with pytest.raises(JobFailed, match="Lease expired"):
+            await queue.wait(job_id, timeout=1)
+
+    run_queue(collection_name, test)
+
+
+def test_abandoned_job_can_not_be_completed(collection_name):
+    async def test(queue):
+        job_id = await queue.enqueue("render", {})
+        job = await queue.claim("worker-a")
+
+        assert (await queue.abandon(job_id))["status"] == queue.LEASED
+        assert not await queue.complete(job, ["late"])
+        assert not await queue.collection.count_documents(
+            {"_id": job_id, "status": queue.DONE}
+        )
+
+    run_queue(collection_name, test)
@@ -0,0 +1,99 @@
+"""Tests for the PostCardBot middlewares."""
+
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import Bot, Dispatcher, types
+
+import pytest
+
+from PostCardBot.core import config, rollup
+from PostCardBot.core.model import User
+
+
+class FakeCollection:
+    """In-memory stand-in for the user collection."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        document = self.documents.get(query["id"])
+        return dict(document) if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        upserted_id = None
+        document = self.documents.get(query["id"])
+        if document is None:
+            document = self.documents[query["id"]] = {
+                "id": query["id"],
+                **update.get("$setOnInsert", {}),
+            }
+            upserted_id = query["id"]
+        document.update(update.get("$set", {}))
+        return SimpleNamespace(upserted_id=upserted_id)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(User, "collection", collection, raising=False)
+    monkeypatch.setattr(rollup, "pending", rollup.defaultdict(rollup.Counter))
+    return collection
+
+
+def make_update(update_id, user_id):
+    return types.Update(
+        update_id=update_id,
+        message={
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Abebe"},
+            "text": "hello",
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def dispatcher():
+    """Dispatcher with the bot middlewares, which can be set up once."""
+
+    bot = Bot(token="123456:ABCDEFabcdef")
+    dp = Dispatcher(bot)
+    for middleware in config.middlewares:
+        dp.middleware.setup(middleware)
+    seen = []
+
+    async def handler(message: types.Message):
+        seen.append(message.from_user.is_active)
+
+    dp.register_message_handler(handler)
+    dp.seen = seen
+    return dp
+
+
+def process_updates(dp, *updates):
+    async def process():
+        for update in updates:
+            await dp.process_update(update)
+
+    dp.seen.clear()
+    asyncio.run(process())
+    return list(dp.seen)
+
+
+def test_new_user_is_counted_once(dispatcher, collection):
+    seen = process_updates(dispatcher, make_update(1, 42), make_update(2, 42))
+
+    assert seen == [True, True]
+    assert 42 in collection.documents
+    assert rollup.pending[rollup.day_key()]["new_users"] == 1
+
+
+def test_known_user_is_not_counted(dispatcher, collection):
+    collection.documents[42] = {"id": 42, "first_name": "Abebe"}
+
+    process_updates(dispatcher, make_update(1, 42))
+
+    assert rollup.pending[rollup.day_key()]["new_users"] == 0
@@ -0,0 +1,96 @@
+"""Tests for the PostCardBot render scheduler."""
+
+import asyncio
+
+import pytest
+
+from PostCardBot.core import config
+from PostCardBot.core.scheduler import (
+    QueueFull,
+    RenderScheduler,
+    UserLimitReached,
+)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(config, "RENDER_CONCURRENCY", 1)
+    monkeypatch.setattr(config, "RENDER_QUEUE_SIZE", 3)
+    monkeypatch.setattr(config, "RENDER_USER_LIMIT", 2)
+    # Every test gets its own scheduler and event loop.
+    monkeypatch.delattr(RenderScheduler, "instance", raising=False)
+
+
+def run_scheduler(test):
+    """Run a test coroutine with a new scheduler, stopped afterwards."""
+
+    async def run():
+        scheduler = RenderScheduler()
+        try:
+            await test(scheduler)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+
+
+def render(done, name):
+    async def factory():
+        done.append(name)
+        return name
+
+    return factory
+
+
+def test_previews_run_before_batches():
+    async def test(scheduler):
+        done = []
+        first = scheduler.submit(1, RenderScheduler.BATCH, render(done, "a"))
+        second = scheduler.submit(2, RenderScheduler.BATCH, render(done, "b"))
+        preview = scheduler.submit(
+            3, RenderScheduler.PREVIEW, render(done, "c")
+        )
+
+        # The preview jumps the waiting batch, the worker is still free.
+        assert (first.position, second.position) == (0, 1)
+        assert preview.position == 0
+        assert await asyncio.gather(first, second, preview) == ["a", "b", "c"]
+        assert done == ["c", "a", "b"]
+
+    run_scheduler(test)
+
+
+def test_user_limit():
+    async def test(scheduler):
+        done = []
+        scheduler.submit(1, RenderScheduler.PREVIEW, render(done, "a"))
+        job = scheduler.submit(1, RenderScheduler.PREVIEW, render(done, "b"))
+        with pytest.raises(UserLimitReached):
+            scheduler.submit(1, RenderScheduler.PREVIEW, render(done, "c"))
+        scheduler.submit(2, RenderScheduler.PREVIEW, render(done, "d"))
+
+        await job
+        assert await scheduler.submit(
+            1, RenderScheduler.PREVIEW, render(done, "e")
+        )
+        assert scheduler.metrics()["rejected"] == 1
+
+    run_scheduler(test)
+
+
+def test_queue_full():
+    async def test(scheduler):
+        jobs = [
+            scheduler.submit(user_id, RenderScheduler.BATCH, render([], "a"))
+            for user_id in range(3)
+        ]
+        with pytest.raises(QueueFull):
+            scheduler.submit(3, RenderScheduler.PREVIEW, render([], "b"))
+
+        metrics = scheduler.metrics()
+        assert metrics["depth"] == metrics["capacity"] == 3
+        assert metrics["rejected"] == 1
+        await asyncio.gather(*jobs)
+        assert scheduler.metrics()["completed"] == 3
+
+    run_scheduler(test)
@@ -0,0 +1,59 @@
+"""Tests for the PostCardBot postcard search."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from PostCardBot.core.search import SearchIndex, normalize
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.update(
+        [
+            SimpleNamespace(pk=1, name="Happy Birthday", description="Cake"),
+            SimpleNamespace(pk=2, name="Happy New Year", description="Café"),
+            SimpleNamespace(pk=3, name="መልካም ልደት", description="ሐሴት"),
+            SimpleNamespace(pk=4, name="እንኳን ደስ ኣለዎት", description="ፀሐይ"),
+        ]
+    )
+    return index
+
+
+def test_prefix_matching(index):
+    assert index.search("hap") == {1, 2}
+    assert index.search("happy bir") == {1}
+    assert index.search("HAPPY new") == {2}
+    assert index.search("happ birthday") == set()
+    assert index.search("birthday happ") == {1}
+    assert index.search("cafe") == {2}
+    assert index.search("ልደ") == {3}
+    assert index.search("  ") == set()
+
+
+def test_ethiopic_folding(index):
+    assert normalize("ሐሴት") == normalize("ሀሴት") == normalize("ሃሴት")
+    assert normalize("ሠላም") == normalize("ሰላም")
+    assert normalize("ዐለም") == normalize("አለም") == normalize("ኣለም")
+    assert normalize("ፀሐይ") == normalize("ጸሀይ")
+    # Other rows and vowel orders are kept.
+    assert normalize("ሑ") == "ሁ"
+    assert normalize("ለ") != normalize("ሉ")
+
+    assert index.search("ሀሴ") == {3}
+    assert index.search("ጸሀይ") == {4}
+    assert index.search("አለ") == {4}
+
+
+def test_update_reindexes_changed_postcards(index):
+    index.update(
+        [
+            SimpleNamespace(pk=1, name="Happy Birthday", description="Cake"),
+            SimpleNamespace(pk=2, name="Merry Christmas", description=""),
+        ]
+    )
+
+    assert index.search("happy") == {1}
+    assert index.search("merry") == {2}
+    assert index.search("ልደት") == set()